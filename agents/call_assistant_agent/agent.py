@@ -1,24 +1,37 @@
 import os
-import subprocess
 import platform
-import base64
+import subprocess
+import threading
+import time
 from pathlib import Path
+
 from dotenv import load_dotenv
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.tools import tool
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from llm_clients import get_llm
+from transcription import transcribe_wav_bytes
+
+from .dispatch import DISPATCH_PROMPT, DispatchStats, parse_decision
+from .file_index import FileIndex
+from .prefilter import IntentPrefilter
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Get Google API key
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise ValueError(
-        "Google API key not found. Make sure the .env file contains the GEMINI_API_KEY variable."
-    )
+# Folders searched by find_file (add or modify based on your needs)
+SEARCH_PATHS = [
+    os.path.expanduser("~\\Desktop\\Demo_Files"),
+]
+
+# Dispatch mode, overridable with AGENT_MODE: "react" runs the Thought/Action
+# loop, "structured" asks for analysis and tool selection in one JSON answer
+DEFAULT_AGENT_MODE = "react"
+# Upper bound on the tool calls run per segment in structured mode (the react
+# executor keeps AgentExecutor's own limit on LLM round trips)
+AGENT_MAX_ITERATIONS = 3
 
 # Variabile globale per la funzione di callback per le notifiche
 notification_callback_function = None
@@ -40,30 +53,8 @@ def find_file(file_description: str) -> str:
     # Extract potential filename or keywords from the description
     keywords = file_description.lower().split()
 
-    # Define search paths (add or modify based on your needs)
-    search_paths = [
-        os.path.expanduser("~\\Desktop\\Demo_Files")
-        # Add more paths as needed
-    ]
-
-    print(f"Search paths: {search_paths}")
-    
-    potential_files = []
-
-    # Search for files that match the keywords
-    for path in search_paths:
-        if os.path.exists(path):
-            print(f"Searching in: {path}")
-            for root, _, files in os.walk(path):
-                for file in files:
-                    file_lower = file.lower()
-                    score = sum(1 for keyword in keywords if keyword in file_lower)
-                    if score > 0:
-                        full_path = os.path.join(root, file)
-                        potential_files.append((full_path, score))
-
-    # Sort by score (highest first)
-    potential_files.sort(key=lambda x: x[1], reverse=True)
+    # Lookup in the filename index, kept current in the background
+    potential_files = get_file_index().search(keywords, limit=3)
     
     print(f"Potential files found: {potential_files}")
 
@@ -72,7 +63,8 @@ def find_file(file_description: str) -> str:
         result = "Found these files:\n"
         for i, (file_path, _) in enumerate(top_files, 1):
             result += f"{i}. {file_path}\n"
-        file_path = os.path.expanduser(file_path)
+        # Open the best match
+        file_path = os.path.expanduser(top_files[0][0])
         if not os.path.exists(file_path):
             return f"Error: File not found at {file_path}"
         
@@ -173,21 +165,9 @@ def analyze_audio_file(file_path: str) -> str:
         return f"Error analyzing audio file: {e}"
 
 
-# Function to convert audio to base64
-def audio_to_base64(file_path):
-    with open(file_path, "rb") as audio_file:
-        return base64.b64encode(audio_file.read()).decode("utf-8")
-
-
-# Create the LLM model using Google Gemini with multimodal capabilities
-llm = ChatGoogleGenerativeAI(
-    model="gemini-1.5-pro",  # Using the pro model for multimodal capabilities
-    google_api_key=gemini_api_key,
-    temperature=0,  # Use a very low temperature for more deterministic responses
-)
-
 # Create the tools list
 tools = [find_file, open_file, list_audio_files, analyze_audio_file]
+tools_by_name = {t.name: t for t in tools}
 
 # Create the agent prompt
 prompt = ChatPromptTemplate.from_messages([
@@ -219,55 +199,180 @@ Scenario example: user says "Let's talk about file budget.xlsx" -> Use find_file
     ]
 )
 
-# Create the ReAct agent
-react_agent = create_react_agent(llm, tools, prompt)
+_agent = None
+_agent_lock = threading.Lock()
 
-# Create the agent executor
-agent = AgentExecutor(
-    agent=react_agent,
-    tools=tools,
-    verbose=True,
-    handle_parsing_errors=True,
-)
 
+def get_agent() -> AgentExecutor:
+    """
+    Build the agent executor on first use.
+
+    The LLM comes from the shared client registry, so the provider (and its
+    API key check) is only resolved when the agent is actually needed.
+    """
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            # Shared client: the same connection serves the agent and segment transcription
+            llm = get_llm(
+                "gemini-1.5-pro",  # Using the pro model for multimodal capabilities
+                temperature=0,  # Use a very low temperature for more deterministic responses
+            )
+
+            # Create the ReAct agent
+            react_agent = create_react_agent(llm, tools, prompt)
+
+            # Create the agent executor
+            _agent = AgentExecutor(
+                agent=react_agent,
+                tools=tools,
+                verbose=True,
+                handle_parsing_errors=True,
+                return_intermediate_steps=True,
+            )
+        return _agent
+
+
+_file_index = None
+_file_index_lock = threading.Lock()
+
+
+def get_file_index() -> FileIndex:
+    """Index of the file names under SEARCH_PATHS, built once and refreshed in the background."""
+    global _file_index
+    with _file_index_lock:
+        if _file_index is None:
+            _file_index = FileIndex(SEARCH_PATHS)
+            _file_index.start()
+        return _file_index
+
+
+_prefilter = None
+_prefilter_version = None
+_prefilter_lock = threading.Lock()
+
+
+def get_prefilter() -> IntentPrefilter:
+    """Prefilter whose vocabulary holds the names of the files find_file can reach."""
+    global _prefilter, _prefilter_version
+    file_index = get_file_index()
+    with _prefilter_lock:
+        if _prefilter is None:
+            _prefilter = IntentPrefilter()
+        if _prefilter_version != file_index.version:
+            _prefilter_version = file_index.version
+            _prefilter.set_vocabulary(file_index.names())
+        return _prefilter
+
+
+dispatch_stats = DispatchStats()
+
+
+def _run_react(transcription: str) -> tuple[str, int]:
+    agent_result = get_agent().invoke(
+        {"input": f"Audio Transcription: {transcription}"}, config={"tags": ["agent"]}
+    )
+    final_answer = agent_result.get("output", "The agent couldn't process the transcription.")
+    # One LLM round trip per tool step, plus the one producing the final answer
+    return final_answer, len(agent_result.get("intermediate_steps", [])) + 1
+
+
+def _run_structured(transcription: str) -> tuple[str, int]:
+    llm = get_llm("gemini-1.5-pro", temperature=0)
+    response = llm.invoke(
+        [
+            SystemMessage(content=DISPATCH_PROMPT),
+            HumanMessage(content=f"Audio Transcription: {transcription}"),
+        ],
+        config={"tags": ["dispatch"]},
+    )
+    decision = parse_decision(response.content)
+
+    results = []
+    for call in decision.actions[:AGENT_MAX_ITERATIONS]:
+        print(f"Dispatching {call.tool} with: {call.argument}")
+        results.append(f"{call.tool}({call.argument}): {tools_by_name[call.tool].invoke(call.argument)}")
+    if len(decision.actions) > AGENT_MAX_ITERATIONS:
+        print(f"Skipped {len(decision.actions) - AGENT_MAX_ITERATIONS} actions over the iteration cap")
 
-def process_audio_file(file_path):
-    """Process an audio file with Gemini for transcription, then use the agent to act on the content"""
+    final_answer = "\n".join([decision.summary] + results).strip()
+    return final_answer or "No action needed.", 1
+
+
+def run_agent(transcription: str, mode: str | None = None) -> str:
+    """
+    Act on a transcription in the given dispatch mode and record its latency.
+
+    Raises ValueError for an unknown mode and propagates agent errors.
+    """
+    mode = mode or os.getenv("AGENT_MODE", DEFAULT_AGENT_MODE)
+    runners = {"react": _run_react, "structured": _run_structured}
+    if mode not in runners:
+        raise ValueError(f"Unknown agent mode: {mode}")
+
+    started = time.perf_counter()
+    iterations = 0
+    failed = True
+    try:
+        final_answer, iterations = runners[mode](transcription)
+        failed = False
+        return final_answer
+    finally:
+        elapsed = time.perf_counter() - started
+        dispatch_stats.record(mode, elapsed, iterations, failed)
+        print(f"Agent ({mode}) finished in {elapsed:.2f}s with {iterations} LLM call(s)")
+
+
+def process_audio_file(file_path, on_transcription=None, mode=None):
+    """
+    Process an audio file with Gemini for transcription, then use the agent to act on the content.
+    See process_audio_bytes for the arguments.
+    """
     try:
         print(f"Processing audio file: {file_path}")
+        with open(file_path, "rb") as audio_file:
+            audio_bytes = audio_file.read()
+    except Exception as e:
+        print(f"Error in process_audio_file: {e}")
+        return f"Error processing audio file: {e}"
+    return process_audio_bytes(audio_bytes, on_transcription=on_transcription, mode=mode, source=file_path)
+
+
+def process_audio_bytes(audio_bytes, on_transcription=None, mode=None, source=None, raise_errors=False):
+    """
+    Transcribe in-memory WAV bytes with Gemini, then use the agent to act on the content.
+    If given, on_transcription is called with the transcription before the agent runs.
+    mode selects the dispatch mode (see run_agent); source only labels the log output.
+    A failed transcription is returned as an error message, or raised if raise_errors
+    is set; an agent failure still returns the transcription.
+    """
+    try:
+        print(f"Processing audio segment: {source or f'{len(audio_bytes)} bytes'}")
         
         # Invia una notifica se è stata impostata una funzione di callback globale
         global notification_callback_function
         
-        # Convert the audio file to base64
-        base64_audio = audio_to_base64(file_path)
-        
-        # Use the Gemini model directly for audio processing/transcription
-        direct_llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro", google_api_key=gemini_api_key, temperature=0
-        )
-        
-        response = direct_llm.invoke([
-            SystemMessage(content="Transcribe what people in this audio says. If the speaker mentions any filenames or documents, make sure to transcribe them accurately, but if you don't say any file name, just transcribe the audio."),
-            HumanMessage(content=[
-                {
-                    "type": "media",
-                    "mime_type": "audio/wav",
-                    "data": base64_audio
-                }
-            ])
-        ])
-        
-        # Get the transcription result
-        transcription = response.content
+        # Transcribe with Gemini; the result is cached by audio content and
+        # reused when the same segment is synthesized at the end of the call
+        transcription = transcribe_wav_bytes(audio_bytes)
         print(f"Transcription result: {transcription}")
+
+        if on_transcription:
+            try:
+                on_transcription(transcription)
+            except Exception as callback_error:
+                print(f"Error in transcription callback: {callback_error}")
         
+        # Most segments are small talk: only run the agent when files or documents come up
+        if not get_prefilter().should_run(transcription):
+            print("No file or document mentioned, skipping the agent")
+            return f"Transcription: {transcription}\n\nAgent Action: none (no file or document mentioned)"
+
         # Now pass the transcription to the agent to take action based on the content
-        print(f"Passing transcription to agent for processing...")
+        print("Passing transcription to agent for processing...")
         try:
             # Run the agent with the transcription as input
-            agent_result = agent.invoke({"input": f"Audio Transcription: {transcription}"})
-            final_answer = agent_result.get("output", "The agent couldn't process the transcription.")
+            final_answer = run_agent(transcription, mode)
             #print(f"Agent result: {final_answer}")
             return f"Transcription: {transcription}\n\nAgent Action: {final_answer}"
         except Exception as agent_error:
@@ -276,5 +381,7 @@ def process_audio_file(file_path):
             return f"Transcription: {transcription}\n\nNote: Couldn't process with agent due to error: {agent_error}"
         
     except Exception as e:
-        print(f"Error in process_audio_file: {e}")
+        if raise_errors:
+            raise
+        print(f"Error in process_audio_bytes: {e}")
         return f"Error processing audio file: {e}"
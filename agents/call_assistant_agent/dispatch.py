@@ -0,0 +1,81 @@
+import json
+import threading
+from typing import Literal
+
+from pydantic import BaseModel, Field, ValidationError
+
+DISPATCH_PROMPT = """You are a helpful assistant used for work. You receive the transcription of a
+segment of a work call and decide, in a single answer, whether any file or
+document should be searched for or opened.
+
+Available tools:
+- find_file: search the user's files by name keywords (argument: the keywords or file name)
+- open_file: open a file whose full path is known (argument: the path)
+
+If the speakers mention a file or document name, or talk about finding documents
+or files, add a find_file action with those keywords.
+Example: "Let's talk about file budget.xlsx" -> find_file with "budget.xlsx"
+
+Answer with JSON only, no other text, in this format:
+{"summary": "<one sentence on what was said>", "actions": [{"tool": "find_file", "argument": "<keywords>"}]}
+Use an empty "actions" list when nothing needs to be done."""
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+class ToolCall(BaseModel):
+    tool: Literal["find_file", "open_file"]
+    argument: str
+
+
+class DispatchDecision(BaseModel):
+    summary: str = ""
+    actions: list[ToolCall] = Field(default_factory=list)
+
+
+def parse_decision(text: str) -> DispatchDecision:
+    """
+    Parse the model's JSON answer, tolerating code fences or text around it.
+
+    The first JSON object in the text is decoded, and anything after it is
+    ignored. Raises ValueError when no valid decision can be extracted.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"No JSON object in dispatch response: {text[:200]!r}")
+    try:
+        value, _ = _JSON_DECODER.raw_decode(text, start)
+        return DispatchDecision.model_validate(value)
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise ValueError(f"Invalid dispatch response: {e}") from e
+
+
+class DispatchStats:
+    """Per-mode latency and iteration counters for agent invocations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode: str, elapsed: float, iterations: int, failed: bool = False):
+        with self._lock:
+            stats = self._modes.setdefault(
+                mode,
+                {"invocations": 0, "failed": 0, "iterations": 0, "total_s": 0.0, "max_s": 0.0},
+            )
+            stats["invocations"] += 1
+            stats["failed"] += int(failed)
+            stats["iterations"] += iterations
+            stats["total_s"] += elapsed
+            stats["max_s"] = max(stats["max_s"], elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {}
+            for mode, stats in self._modes.items():
+                stats = dict(stats)
+                count = stats["invocations"]
+                stats["mean_s"] = stats["total_s"] / count if count else 0.0
+                stats["mean_iterations"] = stats["iterations"] / count if count else 0.0
+                snapshot[mode] = stats
+            return snapshot
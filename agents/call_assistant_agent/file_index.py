@@ -0,0 +1,303 @@
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+
+from .prefilter import normalize
+
+INDEX_PATH = os.path.join("output", "cache", "file_index.json")
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def name_tokens(name: str) -> set[str]:
+    """Alphanumeric words of a file name ("Budget_2024-v2.xlsx" -> budget, 2024, v2, xlsx)."""
+    word = []
+    tokens = set()
+    for c in name:
+        if c.isalnum():
+            word.append(c)
+        elif word:
+            tokens.add("".join(word))
+            word = []
+    if word:
+        tokens.add("".join(word))
+    return tokens
+
+
+class FileIndex:
+    """
+    Persistent inverted index of the file names under a set of root folders.
+
+    Names are split into words with posting lists of files, and the distinct
+    words are indexed by trigram. A keyword is matched as a substring of the
+    name (as find_file always did) by finding the words that contain it
+    through their trigrams, instead of scanning every file; a keyword found
+    nowhere falls back to the most similar words, to tolerate transcription
+    errors.
+
+    refresh() re-lists only the directories whose mtime changed (creating,
+    removing or renaming an entry updates its parent's mtime), so keeping the
+    index current costs one stat per directory. The directory listings are
+    saved to disk and reloaded on the next start.
+    """
+
+    def __init__(
+        self,
+        roots: Iterable[str],
+        path: str | None = INDEX_PATH,
+        max_age: float = 30.0,
+        fuzzy_threshold: float = 0.6,
+    ):
+        self.roots = [os.path.abspath(os.path.expanduser(r)) for r in roots]
+        self.path = path
+        self.max_age = max_age
+        self.fuzzy_threshold = fuzzy_threshold
+        self.version = 0
+        self.refreshed = 0.0
+        self._lock = threading.RLock()
+        # directory -> (mtime_ns, subdirectories, file ids)
+        self._dirs: dict[str, tuple[int, list[str], list[int]]] = {}
+        self._files: dict[int, tuple[str, str]] = {}  # id -> (directory, name)
+        self._normalized: dict[int, str] = {}
+        self._tokens: dict[str, set[int]] = {}  # word -> file ids
+        self._token_grams: dict[str, set[str]] = {}  # trigram -> words
+        self._next_id = 0
+        self._watcher = None
+        self._stop_event = threading.Event()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def _add_file(self, directory: str, name: str) -> int:
+        file_id = self._next_id
+        self._next_id += 1
+        normalized = normalize(name)
+        self._files[file_id] = (directory, name)
+        self._normalized[file_id] = normalized
+        for token in name_tokens(normalized):
+            postings = self._tokens.get(token)
+            if postings is None:
+                postings = self._tokens[token] = set()
+                for gram in trigrams(token):
+                    self._token_grams.setdefault(gram, set()).add(token)
+            postings.add(file_id)
+        return file_id
+
+    def _remove_file(self, file_id: int):
+        normalized = self._normalized.pop(file_id)
+        del self._files[file_id]
+        for token in name_tokens(normalized):
+            postings = self._tokens.get(token)
+            if postings is None:
+                continue
+            postings.discard(file_id)
+            if not postings:
+                del self._tokens[token]
+                for gram in trigrams(token):
+                    words = self._token_grams.get(gram)
+                    if words is not None:
+                        words.discard(token)
+                        if not words:
+                            del self._token_grams[gram]
+
+    def _set_directory(self, directory: str, mtime: int, subdirs: list[str], names: list[str]):
+        previous = self._dirs.get(directory)
+        if previous is not None:
+            for file_id in previous[2]:
+                self._remove_file(file_id)
+        file_ids = [self._add_file(directory, name) for name in names]
+        self._dirs[directory] = (mtime, subdirs, file_ids)
+
+    def _drop_directory(self, directory: str):
+        for file_id in self._dirs.pop(directory)[2]:
+            self._remove_file(file_id)
+
+    def refresh(self) -> int:
+        """Bring the index up to date; returns the number of directories re-listed."""
+        with self._lock:
+            changed = 0
+            seen = set()
+            stack = [r for r in self.roots if os.path.isdir(r)]
+            while stack:
+                directory = stack.pop()
+                if directory in seen:
+                    continue
+                seen.add(directory)
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    continue
+
+                cached = self._dirs.get(directory)
+                if cached is not None and cached[0] == mtime:
+                    stack.extend(cached[1])
+                    continue
+
+                subdirs, names = [], []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    subdirs.append(entry.path)
+                                else:
+                                    names.append(entry.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                self._set_directory(directory, mtime, subdirs, names)
+                stack.extend(subdirs)
+                changed += 1
+
+            for directory in [d for d in self._dirs if d not in seen]:
+                self._drop_directory(directory)
+                changed += 1
+
+            self.refreshed = time.time()
+            if changed:
+                self.version += 1
+                self._save()
+            return changed
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Impossibile leggere l'indice dei file {self.path}: {e}")
+            return
+        if data.get("roots") != self.roots:
+            return
+        for directory, (mtime, subdirs, names) in data.get("dirs", {}).items():
+            self._set_directory(directory, mtime, subdirs, names)
+        self.version += 1
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {
+            "roots": self.roots,
+            "dirs": {
+                directory: [mtime, subdirs, [self._files[i][1] for i in file_ids]]
+                for directory, (mtime, subdirs, file_ids) in self._dirs.items()
+            },
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def start(self, interval: float | None = None):
+        """Refresh now, then keep refreshing in a background thread."""
+        self.refresh()
+        interval = interval or self.max_age
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop_event.clear()
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval: float):
+        while not self._stop_event.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Errore nell'aggiornamento dell'indice dei file: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.join()
+
+    def _tokens_containing(self, part: str) -> set[str]:
+        if len(part) < 3:
+            # Troppo corta per i trigrammi: confronto diretto con le parole
+            return {t for t in self._tokens if part in t}
+        grams = sorted((self._token_grams.get(g, set()) for g in trigrams(part)), key=len)
+        if not grams[0]:
+            return set()
+        return {t for t in grams[0].intersection(*grams[1:]) if part in t}
+
+    def _similar_tokens(self, part: str) -> dict[str, float]:
+        grams = trigrams(part)
+        if len(grams) < 2:
+            return {}
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._token_grams.get(gram, ()))
+        return {
+            token: count / len(grams)
+            for token, count in shared.items()
+            if count >= self.fuzzy_threshold * len(grams)
+        }
+
+    def _substring_matches(self, keyword: str) -> set[int]:
+        parts = sorted(name_tokens(keyword), key=len, reverse=True)
+        if not parts:
+            return set()
+        matches = None
+        for part in parts:
+            part_matches = set()
+            for token in self._tokens_containing(part):
+                part_matches |= self._tokens[token]
+            matches = part_matches if matches is None else matches & part_matches
+            if not matches:
+                return set()
+        if parts != [keyword]:
+            # Parole e separatori devono comparire nell'ordine della parola chiave
+            matches = {i for i in matches if keyword in self._normalized[i]}
+        return matches
+
+    def _fuzzy_matches(self, keyword: str) -> dict[int, float]:
+        parts = name_tokens(keyword)
+        scores = Counter()
+        for part in parts:
+            best: dict[int, float] = {}
+            for token, similarity in self._similar_tokens(part).items():
+                for file_id in self._tokens[token]:
+                    if similarity > best.get(file_id, 0.0):
+                        best[file_id] = similarity
+            scores.update(best)
+        return {i: score / len(parts) for i, score in scores.items()}
+
+    def search(self, keywords: Iterable[str], limit: int = 3) -> list[tuple[str, float]]:
+        """
+        Best matching paths for the keywords, as (path, score) pairs.
+
+        Each keyword found in a name adds 1 to its score; a keyword found in
+        no name at all adds the average similarity of its words to the
+        closest words of the name.
+        """
+        if self._watcher is None and time.time() - self.refreshed > self.max_age:
+            self.refresh()
+
+        scores = Counter()
+        with self._lock:
+            for keyword in {normalize(k) for k in keywords if k.strip()}:
+                matches = self._substring_matches(keyword)
+                if matches:
+                    scores.update(matches)
+                else:
+                    scores.update(self._fuzzy_matches(keyword))
+            ranked = heapq.nsmallest(
+                limit, scores.items(), key=lambda item: (-item[1], len(self._files[item[0]][1]))
+            )
+            return [(os.path.join(*self._files[i]), score) for i, score in ranked]
+
+    def names(self) -> list[str]:
+        """All indexed file names."""
+        with self._lock:
+            return [name for _, name in self._files.values()]
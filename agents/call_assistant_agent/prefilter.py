@@ -0,0 +1,109 @@
+import re
+import threading
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable
+
+# Word stems (Italian and English) that suggest the speaker is talking about
+# files or asking to look something up; matched at the start of a word
+INTENT_STEMS = (
+    "file", "document", "cartell", "allegat", "presentazion", "slide", "foglio",
+    "fogli", "tabell", "excel", "word", "powerpoint", "report", "relazion",
+    "verbal", "contratt", "apri", "mostr", "cerc", "trov", "condivid",
+    "open", "folder", "spreadsheet", "attachment", "presentation", "sheet",
+    "show", "find", "search", "share",
+)
+
+FILE_EXTENSIONS = (
+    "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "csv", "txt", "md",
+    "json", "png", "jpg", "jpeg", "wav", "mp3", "mp4", "zip",
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents, so 'Relazióne' and 'relazione' compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class IntentPrefilter:
+    """
+    Cheap local check deciding whether a transcription needs the agent.
+
+    A transcription passes when it contains an intent keyword, a file name
+    with a known extension (written "budget.xlsx" or spoken "budget punto
+    xlsx"), or a word from the vocabulary of indexed file names. Everything
+    else (small talk, in most segments) skips the agent's LLM round trips.
+    """
+
+    def __init__(
+        self,
+        stems: Iterable[str] = INTENT_STEMS,
+        extensions: Iterable[str] = FILE_EXTENSIONS,
+        vocabulary: Iterable[str] = (),
+        min_term_length: int = 4,
+    ):
+        self.min_term_length = min_term_length
+        self._stem_pattern = re.compile(
+            r"\b(?:" + "|".join(sorted(map(re.escape, stems), key=len, reverse=True)) + r")\w*"
+        )
+        extension_group = "|".join(sorted(map(re.escape, extensions), key=len, reverse=True))
+        self._extension_pattern = re.compile(
+            rf"\b\w[\w\-]*(?:\.|\s+(?:punto|dot)\s+)(?:{extension_group})\b"
+        )
+        self._extensions = frozenset(extensions)
+        self._vocabulary = frozenset()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reasons = Counter()
+        self.set_vocabulary(vocabulary)
+
+    def set_vocabulary(self, names: Iterable[str]):
+        """Replace the vocabulary with the distinctive words of the given file names."""
+        terms = set()
+        for name in names:
+            for word in _WORD_PATTERN.findall(normalize(name).replace("_", " ")):
+                if (
+                    len(word) >= self.min_term_length
+                    and not word.isdigit()
+                    and word not in self._extensions
+                ):
+                    terms.add(word)
+        self._vocabulary = frozenset(terms)
+
+    def match(self, text: str) -> str | None:
+        """Return why the transcription needs the agent, or None if it does not."""
+        text = normalize(text)
+        if self._extension_pattern.search(text):
+            return "extension"
+        if self._stem_pattern.search(text):
+            return "keyword"
+        vocabulary = self._vocabulary
+        if vocabulary and any(word in vocabulary for word in _WORD_PATTERN.findall(text)):
+            return "vocabulary"
+        return None
+
+    def should_run(self, text: str) -> bool:
+        """Like match(), but also updates the hit/miss counters."""
+        reason = self.match(text)
+        with self._lock:
+            if reason is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.reasons[reason] += 1
+        return reason is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skip_rate": self.misses / total if total else 0.0,
+                "reasons": dict(self.reasons),
+                "vocabulary": len(self._vocabulary),
+            }
@@ -1,26 +1,298 @@
-import pyaudio
-import numpy as np
-import time
+import os
 import threading
+import time
 import wave
-from typing import Callable
+from collections import deque
+from typing import Callable, Optional
+
+import numpy as np
+
+from audio_sources import COMPLETE, CONTINUE, AudioSource, MicrophoneSource
+from resampler import PolyphaseResampler, to_mono
+from spool import (
+    WAV_HEADER_BYTES,
+    SegmentStore,
+    WavSpoolWriter,
+    encode_wav,
+    get_segment_store,
+    recover_spool,
+)
+from vad import VoiceActivityDetector
 
 # Non importiamo direttamente la funzione qui per evitare importazioni circolari,
 # la importeremo solo dove necessario
 
 
+class RingBuffer:
+    """Buffer circolare int16 preallocato a capacità fissa.
+
+    Le append costano O(1) (al massimo due copie di slice), la coda recente è
+    restituita come vista senza copie e il segmento viene copiato una sola
+    volta quando viene consegnato all'elaborazione.
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        if capacity <= 0:
+            raise ValueError("La capacità del buffer deve essere positiva")
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._start = 0  # Indice del campione più vecchio
+        self._size = 0  # Numero di campioni validi
+        self.overwritten = 0  # Campioni persi per overflow
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def free(self) -> int:
+        """Spazio libero prima di iniziare a sovrascrivere i campioni più vecchi"""
+        return self.capacity - self._size
+
+    def append(self, samples: np.ndarray):
+        """Aggiunge i campioni in coda, sovrascrivendo i più vecchi se pieno"""
+        n = len(samples)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            # Il blocco da solo riempie tutto il buffer: teniamo solo la coda
+            self.overwritten += self._size + n - self.capacity
+            self._data[:] = samples[-self.capacity :]
+            self._start = 0
+            self._size = self.capacity
+            return
+
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._data[end : end + first] = samples[:first]
+        if first < n:
+            self._data[: n - first] = samples[first:]
+
+        overflow = self._size + n - self.capacity
+        if overflow > 0:
+            self.overwritten += overflow
+            self._start = (self._start + overflow) % self.capacity
+            self._size = self.capacity
+        else:
+            self._size += n
+
+    def tail(self, n: int) -> np.ndarray:
+        """Ultimi n campioni; vista senza copie se contigui in memoria"""
+        n = min(n, self._size)
+        end = self._start + self._size
+        if end <= self.capacity:
+            return self._data[end - n : end]
+        end %= self.capacity
+        if n <= end:
+            return self._data[end - n : end]
+        # Caso raro: la finestra scavalca la fine dell'array
+        return np.concatenate((self._data[self.capacity - (n - end) :], self._data[:end]))
+
+    def copy_out(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Copia contigua dei campioni [start, end) relativi al più vecchio (unica copia)"""
+        end = self._size if end is None else min(end, self._size)
+        start = max(0, min(start, end))
+        first = self._start + start
+        last = self._start + end
+        if last <= self.capacity:
+            return self._data[first:last].copy()
+        if first >= self.capacity:
+            return self._data[first - self.capacity : last - self.capacity].copy()
+        return np.concatenate(
+            (self._data[first:], self._data[: last - self.capacity])
+        )
+
+    def discard(self, n: int):
+        """Scarta gli n campioni più vecchi in O(1)"""
+        n = min(n, self._size)
+        self._start = (self._start + n) % self.capacity
+        self._size -= n
+        if self._size == 0:
+            self._start = 0
+
+    def clear(self):
+        """Svuota il buffer senza riallocare memoria"""
+        self._start = 0
+        self._size = 0
+
+
+class SegmentWorkerPool:
+    """Pool di worker a coda limitata per l'elaborazione dei segmenti audio.
+
+    Quando la coda è piena si applica la politica di overflow:
+    - "block": attende che si liberi un posto (blocca il thread di cattura)
+    - "drop_oldest": scarta il segmento più vecchio in coda
+    - "merge": accoda il nuovo segmento all'ultimo in attesa, che è adiacente
+      nel tempo, così non si perde audio e le chiamate API restano limitate;
+      merge_args(vecchi, nuovi) decide gli argomenti del segmento unito.
+      Un segmento unito non supera max_merge_samples campioni: oltre il limite
+      si ripiega su "drop_oldest", così un worker bloccato non fa crescere la
+      memoria senza limite
+    """
+
+    POLICIES = ("block", "drop_oldest", "merge")
+
+    def __init__(
+        self,
+        process_function: Callable,
+        num_workers: int = 2,
+        max_queue_size: int = 4,
+        overflow_policy: str = "merge",
+        merge_args: Optional[Callable] = None,
+        max_merge_samples: Optional[int] = None,  # None = nessun limite
+    ):
+        if overflow_policy not in self.POLICIES:
+            raise ValueError(
+                f"Politica di overflow non valida: {overflow_policy} (valori ammessi: {self.POLICIES})"
+            )
+        self.process_function = process_function
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.overflow_policy = overflow_policy
+        self.merge_args = merge_args
+        self.max_merge_samples = max_merge_samples
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._closed = False
+        self._active = 0
+
+        # Contatori esposti per il monitoraggio
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.merged = 0
+        self.max_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Numero di segmenti in attesa di un worker"""
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self) -> dict:
+        """Istantanea dei contatori del pool"""
+        with self._condition:
+            return {
+                "queue_depth": len(self._queue),
+                "max_depth": self.max_depth,
+                "active": self._active,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "merged": self.merged,
+            }
+
+    def _start_workers(self):
+        while len(self._workers) < self.num_workers:
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, audio_data: np.ndarray, *args) -> bool:
+        """Accoda un segmento; restituisce False se è stato scartato"""
+        with self._condition:
+            if self._closed:
+                self.rejected += 1
+                return False
+            self._start_workers()
+            self.submitted += 1
+
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == "block":
+                    while len(self._queue) >= self.max_queue_size and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        self.rejected += 1
+                        return False
+                elif self.overflow_policy == "merge" and self._can_merge(audio_data):
+                    last_audio, last_args = self._queue[-1]
+                    if self.merge_args:
+                        last_args = self.merge_args(last_args, args)
+                    self._queue[-1] = (np.concatenate((last_audio, audio_data)), last_args)
+                    self.merged += 1
+                    return True
+                else:
+                    self._queue.popleft()
+                    self.rejected += 1
+                    print("Coda di elaborazione piena: scartato il segmento più vecchio")
+
+            self._queue.append((audio_data, args))
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._condition.notify_all()
+            return True
+
+    def _can_merge(self, audio_data: np.ndarray) -> bool:
+        if self.max_merge_samples is None:
+            return True
+        return len(self._queue[-1][0]) + len(audio_data) <= self.max_merge_samples
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                audio_data, args = self._queue.popleft()
+                self._active += 1
+                # Libera eventuali produttori bloccati dalla politica "block"
+                self._condition.notify_all()
+
+            try:
+                self.process_function(audio_data, *args)
+                succeeded = True
+            except Exception as e:
+                print(f"Errore durante l'elaborazione del segmento: {e}")
+                succeeded = False
+
+            with self._condition:
+                self._active -= 1
+                if succeeded:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+                self._condition.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        """Chiude il pool; con wait=True elabora prima i segmenti in coda"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            workers = list(self._workers)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
 class AudioMonitor:
     def __init__(
         self,
         process_function: Callable[[np.ndarray, int], None],
-        silence_threshold: int = 500,  # Modificato per int16
+        silence_threshold: int = 500,  # RMS minimo del parlato (int16)
         max_segment_duration: float = 20.0,  # 2 minuti in secondi
         min_segment_duration: float = 7.0,  # Lunghezza minima del batch in secondi
         sample_rate: int = 44100,
         chunk_size: int = 1024,
         channels: int = 1,
         notification_callback=None,
+        num_workers: int = 2,
+        max_queue_size: int = 4,
+        overflow_policy: str = "merge",
+        vad=None,
+        pre_roll_duration: float = 0.3,  # Audio mantenuto prima dell'inizio del parlato
+        target_sample_rate: int = 16000,  # Sample rate dei segmenti consegnati (None = invariato)
+        source: Optional[AudioSource] = None,  # Default: microfono tramite PyAudio
+        spool_dir: str = os.path.join("output", "spool"),  # None = nessuno spool su disco
+        segment_store: Optional[SegmentStore] = None,  # Registro di sessioni e segmenti
     ):
+        # Le sorgenti con formato fisso (es. file registrati) impongono il proprio
+        self.source = source or MicrophoneSource()
+        sample_rate = self.source.sample_rate or sample_rate
+        channels = self.source.channels or channels
+
         self.process_function = process_function
         self.silence_threshold = silence_threshold
         self.max_segment_duration = max_segment_duration
@@ -29,14 +301,51 @@ class AudioMonitor:
         self.chunk_size = chunk_size
         self.channels = channels
         self.notification_callback = notification_callback
+        self.pre_roll_duration = pre_roll_duration
+        self.pre_roll_samples = int(pre_roll_duration * sample_rate) * channels
+        self.target_sample_rate = target_sample_rate
+        self._resamplers = {}
+        self.spool_dir = spool_dir
+        self.segment_store = segment_store or get_segment_store()
+
+        # VAD intercambiabile: qualsiasi oggetto con is_speech(frame) e reset()
+        self.vad = vad or VoiceActivityDetector(
+            sample_rate=sample_rate,
+            frame_size=chunk_size,
+            energy_floor=silence_threshold,
+        )
 
-        self.audio = pyaudio.PyAudio()
-        self.stream = None
-        self.current_buffer = np.array([], dtype=np.int16)
-        self.last_active_time = 0
+        # Pool limitato: memoria e chiamate API concorrenti restano costanti
+        self.worker_pool = SegmentWorkerPool(
+            self._deliver_segment,
+            num_workers=num_workers,
+            max_queue_size=max_queue_size,
+            overflow_policy=overflow_policy,
+            merge_args=self._merge_segment_args,
+            max_merge_samples=self._max_segment_samples(sample_rate, channels),
+        )
+
+        # Buffer preallocato per un segmento di durata massima, più un chunk di
+        # margine: il callback non rialloca mai memoria
+        capacity = (
+            int(np.ceil(max_segment_duration * sample_rate / chunk_size)) + 1
+        ) * chunk_size * channels
+        self.current_buffer = RingBuffer(capacity)
+        # Il buffer è condiviso tra il thread di PortAudio e stop_monitoring
+        self.buffer_lock = threading.RLock()
         self.recording = False
-        self.last_process_time = time.time()
         self.recording_start_time = None
+        self.session_id = None
+        self.samples_captured = 0  # Campioni ricevuti dalla sorgente in questa sessione
+
+        # Posizioni del parlato nel segmento corrente (campioni dall'inizio del buffer)
+        self._speech_start = None
+        self._speech_end = 0
+
+        # Spool su disco del segmento corrente: parte dall'indice _spool_origin del buffer
+        self._spool_writer = None
+        self._spool_origin = 0
+        self._spool_counter = 0
 
     def start_monitoring(self, device_index=None):
         """Avvia il monitoraggio audio dal microfono e dagli altoparlanti"""
@@ -46,50 +355,32 @@ class AudioMonitor:
 
         self.recording = True
         self.recording_start_time = time.time()
-
-        # Ottieni il dispositivo di input predefinito se non specificato
-        if device_index is None:
-            try:
-                device_info = self.audio.get_default_input_device_info()
-                device_index = device_info["index"]
-            except:
-                print(
-                    "Impossibile ottenere il dispositivo di input predefinito. Utilizzo del dispositivo 0."
-                )
-                device_index = 0
+        # Nuova sessione: i segmenti delle sessioni precedenti vanno in archivio
+        self.session_id = self.segment_store.start_session()
+        self.segment_store.archive_sessions(keep=self.session_id)
+        self.samples_captured = 0
+        self.vad.reset()
 
         try:
-            # Ottieni informazioni sul dispositivo per verificare i canali supportati
-            device_info = self.audio.get_device_info_by_index(device_index)
-            max_channels = int(device_info["maxInputChannels"])
-
-            # Aggiusta il numero di canali se necessario
-            if self.channels > max_channels:
-                print(
-                    f"Il dispositivo supporta solo {max_channels} canali, modificando da {self.channels}"
-                )
-                self.channels = max_channels
-
-            # Verifica se il sample rate è supportato
-            if self.sample_rate != int(device_info["defaultSampleRate"]):
-                print(
-                    f"Nota: Il sample rate predefinito del dispositivo è {int(device_info['defaultSampleRate'])}Hz"
-                )
-
-            # Apri lo stream audio per l'input
-            self.stream = self.audio.open(
-                format=pyaudio.paInt16,  # Modificato da paFloat32 a paInt16
-                channels=self.channels,
-                rate=self.sample_rate,
-                input=True,
-                input_device_index=device_index,
-                frames_per_buffer=self.chunk_size,
-                stream_callback=self._audio_callback,
+            self.sample_rate, self.channels = self.source.start(
+                self._audio_callback,
+                self.sample_rate,
+                self.channels,
+                self.chunk_size,
+                device_index=device_index,
             )
-
-            print(
-                f"Avviato monitoraggio audio sul dispositivo {device_index}: {device_info['name']}"
+            self.pre_roll_samples = int(self.pre_roll_duration * self.sample_rate) * self.channels
+            self.worker_pool.max_merge_samples = self._max_segment_samples(
+                self.sample_rate, self.channels
+            )
+            # I buffer di codifica nascono della dimensione di un segmento massimo (mono)
+            self.segment_store.wav_buffers.reserve(
+                WAV_HEADER_BYTES
+                + self._max_segment_samples(self.target_sample_rate or self.sample_rate, 1) * 2
             )
+            self._recover_spool()
+
+            print(f"Sessione di monitoraggio: {self.session_id}")
             print(
                 f"Utilizzo di {self.channels} canale/i, {self.sample_rate}Hz sample rate"
             )
@@ -105,63 +396,137 @@ class AudioMonitor:
             )
             raise
 
+    def _max_segment_samples(self, sample_rate: int, channels: int) -> int:
+        """Campioni di un segmento di durata massima: limite dei segmenti uniti dal pool"""
+        return int(self.max_segment_duration * sample_rate) * channels
+
     def _audio_callback(self, in_data, frame_count, time_info, status):
         """Chiamato per ogni buffer audio catturato da PyAudio"""
         if not self.recording:
-            return (None, pyaudio.paComplete)
+            return (None, COMPLETE)
 
-        # Converti il buffer in un array numpy
+        # Converti il buffer in un array numpy (vista senza copie)
         audio_data = np.frombuffer(in_data, dtype=np.int16)  # Modificato a int16
 
-        # Aggiungi al buffer corrente
-        self.current_buffer = np.append(self.current_buffer, audio_data)
-
-        # Verifica se dovremmo processare in base al tempo o al silenzio
-        self._check_for_processing()
+        # Una sola analisi VAD per chunk (downmix a mono se necessario)
+        if self.channels > 1:
+            mono = audio_data.reshape(-1, self.channels).mean(axis=1)
+        else:
+            mono = audio_data
+        is_speech = self.vad.is_speech(mono)
+
+        with self.buffer_lock:
+            # Se il buffer è pieno consegniamo il segmento prima di sovrascriverlo
+            if self.current_buffer.free < len(audio_data):
+                self._process_current_buffer(force=True)
+
+            # Aggiungi al buffer corrente e, se il segmento è già iniziato, allo spool
+            self.current_buffer.append(audio_data)
+            self.samples_captured += len(audio_data)
+            if self._spool_writer:
+                self._spool_writer.append(audio_data)
+
+            # Verifica se dovremmo processare in base al parlato o alla durata
+            self._check_for_processing(is_speech)
+
+        return (None, CONTINUE)
+
+    def _check_for_processing(self, is_speech: bool):
+        """Taglia il segmento corrente sui confini del parlato o alla durata massima"""
+        buffer_len = len(self.current_buffer)
+        buffer_duration = buffer_len / (self.sample_rate * self.channels)
+
+        if is_speech:
+            # Il chunk appena aggiunto contiene parlato (o è nell'hangover)
+            if self._speech_start is None:
+                self._speech_start = max(0, buffer_len - self.chunk_size * self.channels)
+                self._open_spool()
+            self._speech_end = buffer_len
+        elif self._speech_start is None:
+            # Solo rumore finora: teniamo al massimo il pre-roll, senza copie
+            excess = buffer_len - self.pre_roll_samples
+            if excess > 0:
+                self.current_buffer.discard(excess)
+            return
+        elif buffer_duration >= self.min_segment_duration:
+            # Fine del parlato dopo l'hangover: taglio sul confine naturale
+            self._process_current_buffer()
+            return
 
-        return (None, pyaudio.paContinue)
+        # Processa in base alla durata massima del segmento
+        if buffer_duration >= self.max_segment_duration:
+            self._process_current_buffer(force=True)
 
-    def _check_for_processing(self):
-        """Verifica se dobbiamo processare il buffer corrente in base al tempo o al silenzio"""
-        current_time = time.time()
+    def _segment_start(self) -> int:
+        """Inizio del segmento nel buffer, pre-roll incluso"""
+        start = max(0, self._speech_start - self.pre_roll_samples)
+        return start - start % self.channels
 
-        # Calcola la durata attuale del buffer in secondi
-        buffer_duration = len(self.current_buffer) / (self.sample_rate * self.channels)
-
-        # Controlla il silenzio (forma d'onda piatta)
-        if len(self.current_buffer) >= self.chunk_size:
-            # Calcola RMS (root mean square) per rilevare il silenzio
-            rms = np.sqrt(
-                np.mean(
-                    np.square(
-                        self.current_buffer[-self.chunk_size :].astype(np.float32)
-                    )
-                )
+    def _open_spool(self):
+        """Apre il file di spool all'inizio del parlato, scrivendo il pre-roll già in memoria"""
+        if not self.spool_dir:
+            return
+        self._spool_counter += 1
+        path = os.path.join(
+            self.spool_dir, f"spool_{int(time.time() * 1000)}_{self._spool_counter}.wav"
+        )
+        try:
+            self._spool_writer = WavSpoolWriter(
+                path,
+                self.sample_rate,
+                self.channels,
+                capacity_samples=self.current_buffer.capacity,
             )
+            self._spool_origin = self._segment_start()
+            self._spool_writer.append(self.current_buffer.copy_out(self._spool_origin))
+        except Exception as e:
+            print(f"Impossibile aprire il file di spool {path}: {e}")
+            self._spool_writer = None
+
+    def _close_spool(self, end: Optional[int] = None):
+        """Finalizza il file di spool fino all'indice end del buffer (None = scarta)"""
+        writer, self._spool_writer = self._spool_writer, None
+        if writer is None:
+            return []
+        try:
+            if end is None:
+                writer.discard()
+                return []
+            return [writer.close(end - self._spool_origin)]
+        except Exception as e:
+            print(f"Errore nella chiusura del file di spool {writer.path}: {e}")
+            return []
 
-            # Se l'audio è attivo, aggiorna il tempo dell'ultima attività
-            if rms > self.silence_threshold:
-                self.last_active_time = current_time
-
-            # Processa se rileviamo silenzio dopo attività E il buffer ha la durata minima richiesta
-            silence_duration = current_time - self.last_active_time
-            if (
-                silence_duration > 0.5
-                and rms <= self.silence_threshold
-                and buffer_duration >= self.min_segment_duration
-            ):
-                self._process_current_buffer()
+    def _recover_spool(self):
+        """Rimette in coda i segmenti rimasti nello spool da un'esecuzione interrotta"""
+        if not self.spool_dir:
+            return
+        for path in recover_spool(self.spool_dir):
+            try:
+                with wave.open(path, "rb") as wf:
+                    audio_data = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+                    sample_rate, channels = wf.getframerate(), wf.getnchannels()
+            except Exception as e:
+                print(f"Impossibile leggere il segmento recuperato {path}: {e}")
+                continue
+            print(f"Recuperato segmento non elaborato dallo spool: {path}")
+            self.worker_pool.submit(
+                audio_data,
+                sample_rate,
+                channels,
+                self.notification_callback,
+                [path],
+                {"session_id": self.session_id, "recovered_from": os.path.basename(path)},
+            )
 
-        # Processa in base alla durata massima del segmento
-        time_since_last_process = current_time - self.last_process_time
-        if (
-            time_since_last_process >= self.max_segment_duration
-            and buffer_duration >= self.min_segment_duration
-        ):
-            self._process_current_buffer()
+    def _reset_segment(self):
+        self._close_spool()
+        self.current_buffer.clear()
+        self._speech_start = None
+        self._speech_end = 0
 
-    def _process_current_buffer(self):
-        """Invia il buffer audio corrente alla funzione di elaborazione e reimposta il buffer"""
+    def _process_current_buffer(self, force: bool = False):
+        """Invia il parlato del buffer corrente alla funzione di elaborazione e reimposta il buffer"""
         if len(self.current_buffer) == 0:
             return
 
@@ -169,19 +534,89 @@ class AudioMonitor:
         buffer_duration = len(self.current_buffer) / (self.sample_rate * self.channels)
 
         # Controlla la durata minima
-        if buffer_duration < self.min_segment_duration:
+        if buffer_duration < self.min_segment_duration and not force:
             # Se il buffer è troppo breve, non lo processiamo ancora
             return
 
-        # Elabora i dati audio in un thread separato per evitare il blocco
-        buffer_to_process = self.current_buffer.copy()
-        threading.Thread(
-            target=self.process_function, args=(buffer_to_process, self.sample_rate, self.notification_callback)
-        ).start()
+        if self._speech_start is None:
+            # Nessun parlato rilevato: non inviamo rumore ambientale alla trascrizione
+            self._reset_segment()
+            return
+
+        # Elabora i dati audio nel pool di worker per evitare il blocco,
+        # includendo il pre-roll ed escludendo il rumore dopo l'hangover
+        start = self._segment_start()
+        buffer_to_process = self.current_buffer.copy_out(start, self._speech_end)
+        spool_paths = self._close_spool(self._speech_end)
+
+        # Posizione del segmento nella sessione, in frame alla frequenza di cattura
+        buffer_origin = self.samples_captured - len(self.current_buffer)
+        segment_info = {
+            "session_id": self.session_id,
+            "start_sample": (buffer_origin + start) // self.channels,
+            "end_sample": (buffer_origin + self._speech_end) // self.channels,
+            "capture_rate": self.sample_rate,
+        }
+        self.worker_pool.submit(
+            buffer_to_process,
+            self.sample_rate,
+            self.channels,
+            self.notification_callback,
+            spool_paths,
+            segment_info,
+        )
+
+        # Reimposta il buffer (senza riallocare)
+        self._reset_segment()
+
+    @staticmethod
+    def _merge_segment_args(old_args, new_args):
+        """Argomenti di due segmenti adiacenti uniti dal pool: si sommano i file di spool"""
+        sample_rate, channels, notification_callback, spool_paths, segment_info = old_args
+        segment_info = dict(segment_info, end_sample=new_args[4].get("end_sample"))
+        return (
+            sample_rate,
+            channels,
+            notification_callback,
+            spool_paths + new_args[3],
+            segment_info,
+        )
+
+    def _deliver_segment(
+        self,
+        audio_data: np.ndarray,
+        sample_rate: int,
+        channels: int,
+        notification_callback=None,
+        spool_paths=(),
+        segment_info=None,
+    ):
+        """Eseguito nel worker: converte in mono, ricampiona e passa il segmento a process_function"""
+        audio_data = to_mono(audio_data, channels)
+
+        if self.target_sample_rate and self.target_sample_rate != sample_rate:
+            resampler = self._resamplers.get(sample_rate)
+            if resampler is None:
+                resampler = PolyphaseResampler(sample_rate, self.target_sample_rate)
+                self._resamplers[sample_rate] = resampler
+            audio_data = resampler.resample(audio_data)
+            sample_rate = self.target_sample_rate
+
+        self.segment_store.take_queued()
+        self.process_function(
+            audio_data, sample_rate, notification_callback, segment_info=segment_info
+        )
+
+        def remove_spool():
+            # Segmento elaborato e su disco: lo spool non serve più per il recupero
+            for path in spool_paths:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Impossibile rimuovere il file di spool {path}: {e}")
 
-        # Reimposta il buffer e aggiorna il tempo dell'ultimo processo
-        self.current_buffer = np.array([], dtype=np.int16)  # Modificato a int16
-        self.last_process_time = time.time()
+        # Le scritture accodate da process_function devono essere concluse prima
+        self.segment_store.when_persisted(self.segment_store.take_queued(), remove_spool)
 
     def stop_monitoring(self):
         """Interrompi il monitoraggio audio"""
@@ -191,52 +626,80 @@ class AudioMonitor:
         self.recording = False
 
         # Elabora l'audio rimanente se soddisfa la lunghezza minima
-        buffer_duration = len(self.current_buffer) / (self.sample_rate * self.channels)
-        if (
-            len(self.current_buffer) > 0
-            and buffer_duration >= self.min_segment_duration
-        ):
-            self._process_current_buffer()
+        with self.buffer_lock:
+            buffer_duration = len(self.current_buffer) / (
+                self.sample_rate * self.channels
+            )
+            if (
+                len(self.current_buffer) > 0
+                and buffer_duration >= self.min_segment_duration
+            ):
+                self._process_current_buffer()
+            else:
+                # Audio troppo breve per essere elaborato: non va recuperato al riavvio
+                self._reset_segment()
 
-        # Chiudi lo stream e termina PyAudio
-        if self.stream:
-            self.stream.stop_stream()
-            self.stream.close()
+        # Chiudi la sorgente (stream e PyAudio per il microfono)
+        self.source.stop()
+        self.source.terminate()
 
-        self.audio.terminate()
-        print("Monitoraggio audio interrotto")
+        # Attendi che i segmenti in coda siano elaborati prima di restituire
+        self.worker_pool.shutdown(wait=True)
+        # ...e che i loro file siano su disco, pronti per la sintesi
+        self.segment_store.flush()
+        self.segment_store.end_session(self.session_id)
+        print(f"Monitoraggio audio interrotto ({self.worker_pool.stats()})")
 
 
 # Esempio di utilizzo
-def process(audio_data: np.ndarray, sample_rate: int, notification_callback=None):
+def process(
+    audio_data: np.ndarray,
+    sample_rate: int,
+    notification_callback=None,
+    segment_info: Optional[dict] = None,
+):
     """Funzione di esempio per l'elaborazione"""
     duration = len(audio_data) / (sample_rate)
     print(f"Elaborazione di {duration:.2f} secondi di dati audio")
 
-    # Crea la directory file/audio se non esiste
-    import os
+    # Codifica il WAV una sola volta, in un buffer riutilizzato tra i segmenti:
+    # gli stessi byte vanno al trascrittore e, in background, su disco
+    # (il manifest li registra subito con il loro seq)
+    store = get_segment_store()
+    buffer = store.wav_buffers.acquire(WAV_HEADER_BYTES + audio_data.size * 2)
+    wav_bytes = encode_wav(audio_data, sample_rate, buffer=buffer)
+    entry = store.save_wav_bytes(wav_bytes, sample_rate, segment_info)
+    filepath = store.path(entry)
+
+    print(f"Audio in salvataggio come {filepath} (segmento {entry['seq']})")
 
-    audio_dir = os.path.join("output", "audio")
-    os.makedirs(audio_dir, exist_ok=True)
+    # Importiamo process_audio_bytes qui per evitare importazioni circolari
+    from agents.call_assistant_agent.agent import process_audio_bytes
 
-    # Salva come file WAV senza conversioni (già in formato int16)
-    timestamp = int(time.time())
-    filename = f"audio_segment_{timestamp}.wav"
-    filepath = os.path.join(audio_dir, filename)
-    with wave.open(filepath, "w") as wf:
-        wf.setnchannels(1)  # Mono
-        wf.setsampwidth(2)  # Int16 = 2 bytes
-        wf.setframerate(sample_rate)
-        wf.writeframes(audio_data.tobytes())
+    # La trascrizione alimenta il riassunto incrementale della sessione
+    on_transcription = None
+    session_id = entry.get("session_id")
+    if session_id:
+        from synthesizer import get_rolling_summarizer
 
-    print(f"Audio salvato come {filepath}")
+        summarizer = get_rolling_summarizer(session_id)
 
-    # Importiamo process_audio_file qui per evitare importazioni circolari
-    from agents.call_assistant_agent.agent import process_audio_file
-    
-    # Processiamo il file audio (il callback globale è già impostato in main.py)
-    process_audio_file(filepath)
+        def on_transcription(transcription):
+            summarizer.add(entry["seq"], transcription)
 
+    # Processiamo il file audio (il callback globale è già impostato in main.py);
+    # se la trascrizione fallisce il segmento resta registrato come "failed"
+    try:
+        process_audio_bytes(
+            wav_bytes, on_transcription=on_transcription, source=filepath, raise_errors=True
+        )
+        store.set_state(entry["seq"], "processed")
+    except Exception:
+        store.set_state(entry["seq"], "failed")
+        raise
+    finally:
+        # Il buffer torna disponibile quando anche la scrittura su disco è conclusa
+        store.when_persisted([entry["seq"]], lambda: store.wav_buffers.release(buffer))
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,198 @@
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+import numpy as np
+
+# Valori di ritorno del callback, compatibili con pyaudio.paContinue/paComplete
+CONTINUE = 0
+COMPLETE = 1
+
+
+class AudioSource(ABC):
+    """Sorgente di frame audio int16 consegnati a un callback in stile PyAudio.
+
+    Il callback ha la firma (in_data, frame_count, time_info, status) e
+    restituisce (None, flag); con flag diverso da CONTINUE la sorgente si ferma.
+    Le sorgenti con un formato fisso (es. un file) espongono sample_rate e
+    channels; quelle che si adattano alla richiesta li lasciano a None.
+    """
+
+    sample_rate: int | None = None
+    channels: int | None = None
+
+    @abstractmethod
+    def start(
+        self,
+        callback: Callable,
+        sample_rate: int,
+        channels: int,
+        chunk_size: int,
+        device_index=None,
+    ) -> tuple[int, int]:
+        """Avvia la consegna dei frame; restituisce (sample_rate, canali) effettivi"""
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Attende la fine dei dati; le sorgenti dal vivo non terminano mai da sole"""
+        return False
+
+    @abstractmethod
+    def stop(self):
+        """Interrompe la consegna dei frame"""
+
+    def terminate(self):
+        """Rilascia le risorse della sorgente"""
+
+
+class MicrophoneSource(AudioSource):
+    """Cattura dal dispositivo di input tramite PyAudio"""
+
+    def __init__(self):
+        # Import ritardato: le altre sorgenti funzionano anche senza PortAudio
+        import pyaudio
+
+        self._pyaudio = pyaudio
+        self.audio = pyaudio.PyAudio()
+        self.stream = None
+
+    def start(self, callback, sample_rate, channels, chunk_size, device_index=None):
+        # Ottieni il dispositivo di input predefinito se non specificato
+        if device_index is None:
+            try:
+                device_info = self.audio.get_default_input_device_info()
+                device_index = device_info["index"]
+            except OSError:
+                print(
+                    "Impossibile ottenere il dispositivo di input predefinito. Utilizzo del dispositivo 0."
+                )
+                device_index = 0
+
+        # Ottieni informazioni sul dispositivo per verificare i canali supportati
+        device_info = self.audio.get_device_info_by_index(device_index)
+        max_channels = int(device_info["maxInputChannels"])
+
+        # Aggiusta il numero di canali se necessario
+        if channels > max_channels:
+            print(
+                f"Il dispositivo supporta solo {max_channels} canali, modificando da {channels}"
+            )
+            channels = max_channels
+
+        # Verifica se il sample rate è supportato
+        if sample_rate != int(device_info["defaultSampleRate"]):
+            print(
+                f"Nota: Il sample rate predefinito del dispositivo è {int(device_info['defaultSampleRate'])}Hz"
+            )
+
+        # Apri lo stream audio per l'input
+        self.stream = self.audio.open(
+            format=self._pyaudio.paInt16,
+            channels=channels,
+            rate=sample_rate,
+            input=True,
+            input_device_index=device_index,
+            frames_per_buffer=chunk_size,
+            stream_callback=callback,
+        )
+
+        print(
+            f"Avviato monitoraggio audio sul dispositivo {device_index}: {device_info['name']}"
+        )
+        return sample_rate, channels
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    def terminate(self):
+        self.audio.terminate()
+
+
+class ReplaySource(AudioSource):
+    """Riproduce un file WAV o un array NumPy attraverso lo stesso callback.
+
+    Con speed=1.0 i frame arrivano in tempo reale, con valori maggiori più
+    velocemente; con speed=None vengono consegnati senza alcuna attesa.
+    """
+
+    def __init__(
+        self,
+        data: str | np.ndarray,
+        sample_rate: int | None = None,
+        channels: int = 1,
+        speed: float | None = 1.0,
+    ):
+        if isinstance(data, np.ndarray):
+            if sample_rate is None:
+                raise ValueError("sample_rate è obbligatorio per la riproduzione di un array")
+            self.samples = np.ascontiguousarray(data, dtype=np.int16)
+            self.sample_rate = sample_rate
+            self.channels = channels
+        else:
+            with wave.open(data, "rb") as wf:
+                if wf.getsampwidth() != 2:
+                    raise ValueError(f"Solo WAV a 16 bit sono supportati: {data}")
+                self.samples = np.frombuffer(
+                    wf.readframes(wf.getnframes()), dtype=np.int16
+                )
+                self.sample_rate = wf.getframerate()
+                self.channels = wf.getnchannels()
+
+        self.speed = speed
+        self.frames_delivered = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._done_event = threading.Event()
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / (self.sample_rate * self.channels)
+
+    def start(self, callback, sample_rate, channels, chunk_size, device_index=None):
+        self._stop_event.clear()
+        self._done_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(callback, chunk_size), daemon=True
+        )
+        self._thread.start()
+        return self.sample_rate, self.channels
+
+    def _run(self, callback, chunk_size):
+        step = chunk_size * self.channels
+        started = time.perf_counter()
+        try:
+            for offset in range(0, len(self.samples), step):
+                if self._stop_event.is_set():
+                    break
+
+                chunk = self.samples[offset : offset + step]
+                if len(chunk) < step:
+                    # L'ultimo blocco viene completato con silenzio come farebbe PortAudio
+                    chunk = np.concatenate((chunk, np.zeros(step - len(chunk), np.int16)))
+
+                if self.speed:
+                    # Rispetta il ritmo richiesto rispetto all'inizio della riproduzione
+                    due = self.frames_delivered / self.sample_rate / self.speed
+                    delay = due - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                time_info = {"input_buffer_adc_time": self.frames_delivered / self.sample_rate}
+                _, flag = callback(chunk.tobytes(), chunk_size, time_info, 0)
+                self.frames_delivered += chunk_size
+                if flag != CONTINUE:
+                    break
+        finally:
+            self._done_event.set()
+
+    def wait(self, timeout=None):
+        return self._done_event.wait(timeout)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
@@ -0,0 +1,315 @@
+"""Benchmark delle fasi della pipeline audio.
+
+Uso:
+    python bench.py resample --seconds 60
+    python bench.py segment [registrazione.wav] --speed 0
+    python bench.py pipeline --latency 0.8 --error-rate 0.05
+    python bench.py topics [cartella] --topic budget
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+WAV_HEADER_BYTES = 44
+
+
+def synthetic_audio(seconds: float, sample_rate: int, seed: int = 0) -> np.ndarray:
+    """Segnale int16 con armoniche modulate e rumore, simile a una voce"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t) ** 2
+    voice = sum(
+        (3000 / k) * np.sin(2 * np.pi * 140 * k * t) for k in range(1, 6)
+    )
+    signal = voice * envelope + rng.normal(0, 200, len(t))
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def bench_resample(args):
+    from resampler import PolyphaseResampler
+
+    audio = synthetic_audio(args.seconds, args.rate)
+    resampler = PolyphaseResampler(args.rate, args.target)
+
+    # Riscaldamento (costruzione di indici e cache NumPy)
+    resampler.resample(audio[: args.rate])
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(args.repeat):
+        resampled = resampler.resample(audio)
+    cpu = (time.process_time() - cpu_start) / args.repeat
+    wall = (time.perf_counter() - wall_start) / args.repeat
+
+    bytes_in = WAV_HEADER_BYTES + audio.nbytes
+    bytes_out = WAV_HEADER_BYTES + resampled.nbytes
+    # Il base64 aggiunge un terzo al payload caricato
+    upload_saved = (bytes_in - bytes_out) * 4 / 3
+
+    print(f"Ricampionamento {args.rate}Hz -> {args.target}Hz di {args.seconds:.0f}s di audio")
+    print(f"  WAV in ingresso: {bytes_in / 1024:.1f} KiB")
+    print(f"  WAV in uscita:   {bytes_out / 1024:.1f} KiB ({bytes_in / bytes_out:.2f}x più piccolo)")
+    print(f"  Upload base64 risparmiato: {upload_saved / 1024:.1f} KiB")
+    print(f"  CPU per secondo di audio: {cpu / args.seconds * 1000:.2f} ms")
+    print(f"  Fattore tempo reale: {args.seconds / wall:.0f}x")
+
+
+def meeting_audio(sample_rate: int, turns: int = 20) -> np.ndarray:
+    """Alterna turni di parlato sintetico e pause con rumore di stanza"""
+    rng = np.random.default_rng(1)
+    parts = []
+    for turn in range(turns):
+        parts.append(synthetic_audio(rng.uniform(2, 12), sample_rate, seed=turn))
+        pause = rng.normal(0, 120, int(rng.uniform(0.8, 4) * sample_rate))
+        parts.append(pause.astype(np.int16))
+    return np.concatenate(parts)
+
+
+def bench_segment(args):
+    from audio import AudioMonitor
+    from audio_sources import ReplaySource
+    from spool import SegmentStore
+
+    speed = args.speed or None
+    if args.wav:
+        source = ReplaySource(args.wav, speed=speed)
+    else:
+        source = ReplaySource(meeting_audio(args.rate), sample_rate=args.rate, speed=speed)
+
+    segments = []
+
+    def collect(audio_data, sample_rate, notification_callback=None, segment_info=None):
+        segments.append(len(audio_data) / sample_rate)
+
+    # Sessioni e spool in una cartella temporanea per non toccare output/
+    workdir = tempfile.mkdtemp(prefix="bench_segment_")
+    monitor = AudioMonitor(
+        process_function=collect,
+        min_segment_duration=args.min_segment,
+        source=source,
+        spool_dir=os.path.join(workdir, "spool"),
+        segment_store=SegmentStore(os.path.join(workdir, "audio")),
+    )
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    monitor.start_monitoring()
+    source.wait()
+    monitor.stop_monitoring()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Audio riprodotto: {source.duration:.1f}s ({source.sample_rate}Hz)")
+    print(f"  Segmenti: {len(segments)}, parlato inviato: {sum(segments):.1f}s")
+    print(f"  Tempo reale: {wall:.2f}s ({source.duration / wall:.0f}x)")
+    print(f"  CPU per secondo di audio: {cpu / source.duration * 1000:.2f} ms")
+
+
+def bench_pipeline(args):
+    from audio_sources import ReplaySource
+    from llm_clients import client_stats, set_provider
+    from llm_providers import MEETING_RESPONSES, FakeProvider, fake_stats
+
+    # Provider LLM deterministico: nessuna chiamata di rete, latenza simulata
+    set_provider(FakeProvider(args.latency, args.jitter, args.error_rate, MEETING_RESPONSES))
+    os.environ["AGENT_MODE"] = args.agent_mode
+
+    speed = args.speed or None
+    if args.wav:
+        source = ReplaySource(args.wav, speed=speed)
+    else:
+        source = ReplaySource(meeting_audio(args.rate, args.turns), sample_rate=args.rate, speed=speed)
+
+    # Segmenti, spool e cache delle trascrizioni finiscono in output/ della cartella temporanea
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from audio import AudioMonitor, process
+        from synthesizer import synthesize_audio_folder
+
+        latencies = []
+
+        def timed_process(audio_data, sample_rate, notification_callback=None, segment_info=None):
+            started = time.perf_counter()
+            process(audio_data, sample_rate, notification_callback, segment_info=segment_info)
+            latencies.append(time.perf_counter() - started)
+
+        monitor = AudioMonitor(
+            process_function=timed_process,
+            min_segment_duration=args.min_segment,
+            source=source,
+        )
+
+        wall_start = time.perf_counter()
+        monitor.start_monitoring()
+        source.wait()
+        stop_start = time.perf_counter()
+        monitor.stop_monitoring()
+        synthesis = synthesize_audio_folder(session_id=monitor.session_id)
+        end_of_call = time.perf_counter() - stop_start
+        wall = time.perf_counter() - wall_start
+        wav_buffers = monitor.segment_store.wav_buffers.allocated
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = fake_stats()
+    print(f"Pipeline offline su {source.duration:.1f}s di audio (latenza LLM {args.latency}s + {args.jitter}s)")
+    if latencies:
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        print(f"  Segmenti: {len(latencies)}, elaborazione media {np.mean(latencies):.2f}s, p95 {p95:.2f}s")
+        print(f"  Buffer WAV allocati: {wav_buffers} per {len(latencies)} segmenti")
+    print(f"  Dalla fine della chiamata alla sintesi: {end_of_call:.2f}s ({len(synthesis)} caratteri)")
+    print(f"  Tempo totale: {wall:.2f}s")
+    print(
+        f"  Chiamate LLM: {stats['calls']}, errori simulati: {stats['errors']}, "
+        f"latenza simulata totale: {stats['latency_s']:.1f}s"
+    )
+    from agents.call_assistant_agent.agent import dispatch_stats, get_prefilter
+
+    prefilter = get_prefilter().stats()
+    print(
+        f"  Prefiltro: agente eseguito {prefilter['hits']} volte, saltato {prefilter['misses']} "
+        f"({prefilter['skip_rate']:.0%})"
+    )
+    for mode, dispatch in dispatch_stats.snapshot().items():
+        print(
+            f"  Agente {mode}: {dispatch['invocations']} esecuzioni, media {dispatch['mean_s']:.2f}s, "
+            f"max {dispatch['max_s']:.2f}s, {dispatch['mean_iterations']:.1f} chiamate LLM ciascuna"
+        )
+    for name, client in client_stats().items():
+        print(f"  Client {name}: creato {client['constructed']} volte, riusato {client['hits']} volte")
+
+
+def serial_topic_search(topic: str, start_path: str) -> list:
+    """Ricerca per argomento originale: ogni file letto per intero e convertito in minuscolo"""
+    contents_list = []
+    for root, _, files in os.walk(start_path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            try:
+                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            if topic.lower() in file.lower() or topic.lower() in content.lower():
+                contents_list.append(file_path)
+    return contents_list
+
+
+def document_tree(root: str, files: int, topics: list, seed: int = 2):
+    """Cartelle di documenti di testo sintetici; una piccola parte cita gli argomenti"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghilmnoprstuvz"))
+    vocabulary = ["".join(rng.choice(letters, rng.integers(3, 10))) for _ in range(20000)]
+    for i in range(files):
+        folder = os.path.join(root, f"progetto_{i % 40}")
+        os.makedirs(folder, exist_ok=True)
+        words = list(rng.choice(vocabulary, rng.integers(200, 6000)))
+        if rng.random() < 0.05:
+            words.insert(int(rng.integers(len(words))), str(rng.choice(topics)).upper())
+        with open(os.path.join(folder, f"documento_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+
+
+def bench_topics(args):
+    from call_reports.content_index import ContentIndex
+    from call_reports.scanner import scan_topics, shutdown
+
+    workdir = tempfile.mkdtemp(prefix="bench_topics_")
+    try:
+        root = args.path
+        if root is None:
+            root = os.path.join(workdir, "documenti")
+            document_tree(root, args.files, args.topic)
+
+        def timed(function):
+            started = time.perf_counter()
+            result = function()
+            return result, time.perf_counter() - started
+
+        serial, serial_s = timed(lambda: {t: serial_topic_search(t, root) for t in args.topic})
+        # Il primo avvio del pool di processi è misurato a parte
+        _, first_s = timed(lambda: scan_topics(args.topic, root, parallel=True))
+        scanned, scan_s = timed(lambda: scan_topics(args.topic, root, parallel=True))
+        in_process, in_process_s = timed(lambda: scan_topics(args.topic, root, parallel=False))
+        shutdown()
+
+        index = ContentIndex(root, os.path.join(workdir, "index.sqlite3"))
+        _, build_s = timed(index.refresh)
+        _, noop_s = timed(index.refresh)
+        indexed, query_s = timed(lambda: {t: [p for p, _ in index.search(t)] for t in args.topic})
+
+        print(f"Ricerca di {len(args.topic)} argomenti in {root}")
+        print(f"  Ciclo seriale originale:      {serial_s * 1000:8.1f} ms")
+        print(f"  Scanner mmap in processo:      {in_process_s * 1000:8.1f} ms")
+        print(f"  Scanner mmap parallelo:        {scan_s * 1000:8.1f} ms (primo avvio {first_s * 1000:.1f} ms)")
+        print(
+            f"  Indice: costruzione {build_s * 1000:.1f} ms, aggiornamento senza modifiche "
+            f"{noop_s * 1000:.1f} ms, interrogazione {query_s * 1000:.1f} ms"
+        )
+        for topic in args.topic:
+            expected = sorted(serial[topic])
+            same = sorted(scanned[topic]) == expected and sorted(in_process[topic]) == expected
+            same = same and sorted(indexed[topic]) == expected
+            print(f"  '{topic}': {len(expected)} file, risultati identici: {'sì' if same else 'no'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    resample = commands.add_parser("resample", help="Costo e risparmio del ricampionamento")
+    resample.add_argument("--seconds", type=float, default=60.0)
+    resample.add_argument("--rate", type=int, default=44100)
+    resample.add_argument("--target", type=int, default=16000)
+    resample.add_argument("--repeat", type=int, default=5)
+    resample.set_defaults(func=bench_resample)
+
+    segment = commands.add_parser("segment", help="Throughput della segmentazione su audio registrato")
+    segment.add_argument("wav", nargs="?", help="File WAV a 16 bit (default: riunione sintetica)")
+    segment.add_argument("--speed", type=float, default=0.0, help="1 = tempo reale, 0 = senza attese")
+    segment.add_argument("--rate", type=int, default=44100)
+    segment.add_argument("--min-segment", type=float, default=2.0)
+    segment.set_defaults(func=bench_segment)
+
+    pipeline = commands.add_parser(
+        "pipeline", help="Cattura, trascrizione, agente e sintesi con un LLM simulato"
+    )
+    pipeline.add_argument("wav", nargs="?", help="File WAV a 16 bit (default: riunione sintetica)")
+    pipeline.add_argument("--speed", type=float, default=0.0, help="1 = tempo reale, 0 = senza attese")
+    pipeline.add_argument("--rate", type=int, default=44100)
+    pipeline.add_argument("--turns", type=int, default=8, help="Turni della riunione sintetica")
+    pipeline.add_argument("--min-segment", type=float, default=2.0)
+    pipeline.add_argument("--latency", type=float, default=0.8, help="Latenza simulata per chiamata (s)")
+    pipeline.add_argument("--jitter", type=float, default=0.4, help="Variazione massima della latenza (s)")
+    pipeline.add_argument("--error-rate", type=float, default=0.0, help="Frazione di chiamate che falliscono")
+    pipeline.add_argument(
+        "--agent-mode", choices=("react", "structured"), default="react", help="Modalità di dispatch dell'agente"
+    )
+    pipeline.set_defaults(func=bench_pipeline)
+
+    topics = commands.add_parser("topics", help="Ricerca per argomento: ciclo seriale, scanner e indice")
+    topics.add_argument("path", nargs="?", help="Cartella da esaminare (default: documenti sintetici)")
+    topics.add_argument("--topic", action="append", help="Argomento da cercare (ripetibile)")
+    topics.add_argument("--files", type=int, default=3000, help="File dei documenti sintetici")
+    topics.set_defaults(func=bench_topics)
+
+    args = parser.parse_args()
+    if args.command == "topics" and not args.topic:
+        args.topic = ["budget", "città", "Riunione"]
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,14 @@
-from fastapi import FastAPI, HTTPException, Body, status, Query
-from fastapi.responses import JSONResponse
+import os
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from fastapi import Body, FastAPI, HTTPException, status
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ServerSelectionTimeoutError
-from bson import ObjectId
-from typing import List
-import os
-from dotenv import load_dotenv
 
-from .models import Report, CallLog
+from .models import CallLog, Report, TopicBatchQuery, TopicBatchResult
 
 load_dotenv()
 
@@ -28,7 +28,7 @@ async def read_root():
     return {"status": "API is running", "version": "1.0"}
 
 
-@app.get("/reports", response_model=List[Report])
+@app.get("/reports", response_model=list[Report])
 async def get_all_reports():
     """
     Get all reports from the database
@@ -52,7 +52,7 @@ async def get_report(report_id: str):
     return report
 
 
-@app.get("/reports/topic/{topic}", response_model=List[Report])
+@app.get("/reports/topic/{topic}", response_model=list[Report])
 async def get_reports_by_topic(topic: str):
     """
     Get all reports with a specific topic
@@ -73,7 +73,23 @@ async def create_report(report: Report = Body(...)):
     return JSONResponse(status_code=status.HTTP_201_CREATED, content=created_report)
 
 
-@app.get("/call-logs", response_model=List[CallLog])
+@app.post("/reports/batch", response_model=list[Report])
+async def create_reports(reports: list[Report] = Body(...)):
+    """
+    Create many reports in the database with a single request
+    """
+    reports = [jsonable_encoder(report) for report in reports]
+    if not reports:
+        return JSONResponse(status_code=status.HTTP_201_CREATED, content=[])
+    new_reports = await reports_collection.insert_many(reports)
+    created_reports = await reports_collection.find(
+        {"_id": {"$in": new_reports.inserted_ids}}
+    ).to_list(len(reports))
+
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content=created_reports)
+
+
+@app.get("/call-logs", response_model=list[CallLog])
 async def get_all_call_logs():
     """
     Get all call logs from the database
@@ -97,7 +113,7 @@ async def get_call_log(call_log_id: str):
     return call_log
 
 
-@app.get("/call-logs/topic/{topic}", response_model=List[CallLog])
+@app.get("/call-logs/topic/{topic}", response_model=list[CallLog])
 async def get_call_logs_by_topic(topic: str):
     """
     Get all call logs with a specific topic
@@ -117,4 +133,20 @@ async def create_call_log(call_log: CallLog = Body(...)):
         {"_id": new_call_log.inserted_id}
     )
 
-    return JSONResponse(status_code=status.HTTP_201_CREATED, content=created_call_log)
\ No newline at end of file
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content=created_call_log)
+
+
+@app.post("/topics/batch", response_model=TopicBatchResult)
+async def get_topics_batch(query: TopicBatchQuery = Body(...)):
+    """
+    Get the reports and call logs of many topics at once, grouped by topic
+    """
+    result = {}
+    collections = {"reports": reports_collection, "call_logs": call_logs_collection}
+    for name in dict.fromkeys(query.include):
+        grouped = {topic: [] for topic in query.topics}
+        cursor = collections[name].find({"topic": {"$in": query.topics}})
+        async for document in cursor:
+            grouped[document["topic"]].append(document)
+        result[name] = grouped
+    return result
@@ -0,0 +1,83 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv("CALL_REPORTS_API_URL", "http://localhost:8000")
+# (connect, read) timeouts in seconds
+API_TIMEOUT = (3.05, 30)
+# Connections kept open to the API; enough for the report workers running at once
+API_POOL_SIZE = 10
+
+
+class ApiClient:
+    """
+    Shared HTTP client for the call reports API.
+
+    One requests.Session keeps a pool of open connections to the API, so
+    consecutive calls skip the TCP handshake; every request has a timeout,
+    and idempotent requests are retried on connection errors and 502-504
+    responses.
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_BASE_URL,
+        timeout=API_TIMEOUT,
+        pool_size: int = API_POOL_SIZE,
+        retries: int = 2,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(f"{self.base_url}{path}", **kwargs)
+
+    def post(self, path: str, json=None, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(f"{self.base_url}{path}", json=json, **kwargs)
+
+    def topics_batch(self, topics: list[str], include: list[str] | None = None) -> dict[str, dict[str, list]]:
+        """
+        Reports and call logs of many topics in one request.
+
+        Returns {"reports": {topic: [...]}, "call_logs": {topic: [...]}}, with
+        an entry (possibly empty) for every requested topic.
+
+        Raises requests.HTTPError if the API answers with an error.
+        """
+        body = {"topics": list(dict.fromkeys(topics))}
+        if include is not None:
+            body["include"] = include
+        response = self.post("/topics/batch", json=body)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.session.close()
+
+
+_client: ApiClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_api_client() -> ApiClient:
+    """Shared API client, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
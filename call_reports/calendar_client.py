@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+# If modifying these scopes, delete the file token.json.
+SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
+
+TOKEN_PATH = "token.json"
+CLIENT_SECRETS_PATH = "credentials.json"
+EVENT_STORE_PATH = os.path.join("output", "cache", "calendar_events.json")
+
+# Repeated queries within this many seconds are answered from the local store
+CALENDAR_MIN_SYNC_INTERVAL = 60
+# The first (full) sync starts this far in the past, so events in progress are included;
+# events that ended before this are dropped from the store at every sync
+FULL_SYNC_LOOKBACK = timedelta(days=1)
+# ...and ends this far in the future; the window is renewed with a new full sync
+# when less than half of it is left, or when a query looks beyond it
+FULL_SYNC_HORIZON = timedelta(days=30)
+
+
+def _parse_time(value: dict) -> datetime | None:
+    # "dateTime" per gli eventi con orario, "date" per quelli di un'intera giornata
+    text = value.get("dateTime") or value.get("date")
+    if not text:
+        return None
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return parsed.astimezone() if parsed.tzinfo is None else parsed
+
+
+class CalendarClient:
+    """
+    Google Calendar events kept in sync in a local store.
+
+    Credentials and the API service are created once and reused (credentials
+    are refreshed only when expired). A full sync lists the events between
+    FULL_SYNC_LOOKBACK ago and FULL_SYNC_HORIZON ahead (timeMin/timeMax) and
+    keeps the returned syncToken; later syncs only fetch what changed since,
+    including deletions. If Google invalidates the token (HTTP 410) the
+    store is rebuilt with a full sync.
+
+    The window bounds the cost of a full sync: recurring events are only
+    expanded up to its end. A syncToken keeps the filters of the request
+    that produced it, so incremental syncs never learn about events beyond
+    the window; once less than half of it is left, or a query needs events
+    past its end, the next sync is a full one over a new window. Events
+    that ended more than FULL_SYNC_LOOKBACK ago are dropped after every
+    sync.
+
+    Queries within min_sync_interval seconds of the last sync do not touch
+    the network. The store is saved to disk, so a restart only needs an
+    incremental sync.
+
+    base_url and credentials allow running against a local stand-in for the
+    Calendar API (e.g. base_url="http://localhost:8085/" with
+    google.auth.credentials.AnonymousCredentials()).
+    """
+
+    def __init__(
+        self,
+        calendar_id: str = "primary",
+        store_path: str | None = EVENT_STORE_PATH,
+        min_sync_interval: float = CALENDAR_MIN_SYNC_INTERVAL,
+        base_url: str | None = None,
+        credentials=None,
+        token_path: str = TOKEN_PATH,
+        client_secrets_path: str = CLIENT_SECRETS_PATH,
+    ):
+        self.calendar_id = calendar_id
+        self.store_path = store_path
+        self.min_sync_interval = min_sync_interval
+        self.base_url = base_url
+        self.token_path = token_path
+        self.client_secrets_path = client_secrets_path
+        self.synced = 0.0
+        self._creds = credentials
+        self._service = None
+        self._lock = threading.RLock()
+        self._sync_token: str | None = None
+        # Fine della finestra coperta dal syncToken
+        self._window_end: datetime | None = None
+        self._events: dict[str, dict] = {}
+        self._stats = {"full_syncs": 0, "incremental_syncs": 0, "requests": 0, "cached_queries": 0}
+        self._load()
+
+    def _credentials(self):
+        creds = self._creds
+        if creds is None and os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.client_secrets_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            with open(self.token_path, "w") as token:
+                token.write(creds.to_json())
+        self._creds = creds
+        return creds
+
+    def _get_service(self):
+        creds = self._credentials()
+        if self._service is None:
+            options = {"api_endpoint": self.base_url} if self.base_url else None
+            self._service = build(
+                "calendar", "v3", credentials=creds, client_options=options, cache_discovery=False
+            )
+        return self._service
+
+    def _load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Impossibile leggere gli eventi salvati {self.store_path}: {e}")
+            return
+        if data.get("calendar_id") != self.calendar_id or data.get("base_url") != self.base_url:
+            return
+        if not data.get("window_end"):
+            # Store precedente alle finestre limitate: serve una sincronizzazione completa
+            return
+        self._sync_token = data.get("sync_token")
+        self._window_end = datetime.fromisoformat(data["window_end"])
+        self._events = data.get("events", {})
+
+    def _save(self):
+        if not self.store_path:
+            return
+        data = {
+            "calendar_id": self.calendar_id,
+            "base_url": self.base_url,
+            "sync_token": self._sync_token,
+            "window_end": self._window_end.isoformat() if self._window_end else None,
+            "events": self._events,
+        }
+        os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+        tmp_path = self.store_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.store_path)
+
+    def _list_pages(self, **params) -> tuple[list[dict], str | None]:
+        service = self._get_service()
+        items, page_token = [], None
+        while True:
+            result = (
+                service.events()
+                .list(calendarId=self.calendar_id, singleEvents=True, pageToken=page_token, **params)
+                .execute()
+            )
+            self._stats["requests"] += 1
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+    def sync(self, force: bool = False, until: datetime | None = None) -> int:
+        """
+        Bring the local store up to date; returns the number of events received.
+
+        until is the latest time the store must cover; a full sync is made
+        if the current window ends before it, or less than half of
+        FULL_SYNC_HORIZON from now. Otherwise skipped if the last sync is
+        more recent than min_sync_interval, unless force.
+        """
+        now = datetime.now(tz=UTC)
+        until = max(until or now, now + FULL_SYNC_HORIZON / 2)
+        with self._lock:
+            covered = self._window_end is not None and until <= self._window_end
+            if not force and covered and time.time() - self.synced < self.min_sync_interval:
+                self._stats["cached_queries"] += 1
+                return 0
+
+            items = None
+            if self._sync_token and covered:
+                try:
+                    items, sync_token = self._list_pages(syncToken=self._sync_token)
+                    self._stats["incremental_syncs"] += 1
+                except HttpError as error:
+                    if error.resp.status != 410:
+                        raise
+                    print("Token di sincronizzazione del calendario scaduto: sincronizzazione completa")
+            if items is None:
+                window_end = max(until, now + FULL_SYNC_HORIZON)
+                items, sync_token = self._list_pages(
+                    timeMin=(now - FULL_SYNC_LOOKBACK).isoformat(), timeMax=window_end.isoformat()
+                )
+                self._events = {}
+                self._window_end = window_end
+                self._stats["full_syncs"] += 1
+
+            for event in items:
+                if event.get("status") == "cancelled":
+                    self._events.pop(event["id"], None)
+                else:
+                    self._events[event["id"]] = {
+                        "start": event.get("start", {}),
+                        "end": event.get("end", {}),
+                        "summary": event.get("summary", ""),
+                    }
+            self._sync_token = sync_token
+            self.synced = time.time()
+            self._prune()
+            self._save()
+            return len(items)
+
+    def _prune(self):
+        # Eventi già conclusi: le sincronizzazioni incrementali non li rimuovono mai
+        horizon = datetime.now().astimezone() - FULL_SYNC_LOOKBACK
+        for event_id, event in list(self._events.items()):
+            end = _parse_time(event["end"]) or _parse_time(event["start"])
+            if end is not None and end < horizon:
+                del self._events[event_id]
+
+    def upcoming(self, hours: float | None = 24, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        (start, summary) of the next events, in start order, syncing first if needed.
+
+        Like a timeMin/timeMax query, an event is included if it has not ended
+        yet and starts within the next `hours` (if None, within the synced
+        window, at least half of FULL_SYNC_HORIZON ahead). start is the
+        "dateTime" or "date" string from the API.
+        """
+        now = datetime.now().astimezone()
+        time_max = now + timedelta(hours=hours) if hours is not None else None
+        self.sync(until=time_max)
+        with self._lock:
+            events = []
+            for event in self._events.values():
+                start, end = _parse_time(event["start"]), _parse_time(event["end"])
+                if start is None:
+                    continue
+                if (end or start) <= now or (time_max is not None and start >= time_max):
+                    continue
+                text = event["start"].get("dateTime") or event["start"].get("date")
+                events.append((start, text, event["summary"]))
+        events.sort(key=lambda e: e[0])
+        return [(text, summary) for _, text, summary in events[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, events=len(self._events))
+
+
+_client: CalendarClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_calendar_client() -> CalendarClient:
+    """Shared calendar client for the primary calendar, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CalendarClient()
+        return _client
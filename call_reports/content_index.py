@@ -0,0 +1,393 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+
+import numpy as np
+
+CONTENT_INDEX_DIR = os.path.join("output", "cache")
+
+# Directories and files never searched for topics
+IGNORED_NAMES = frozenset(
+    {".git", ".venv", "venv", "__pycache__", "node_modules", ".ruff_cache", "output", "uv.lock", ".DS_Store"}
+)
+# Larger files are skipped (logs and dumps rather than documents)
+MAX_FILE_BYTES = 32 * 1024 * 1024
+# Bytes inspected to decide whether a file is binary
+SNIFF_BYTES = 8192
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Bumped when the tables change; an index with another version is rebuilt
+SCHEMA_VERSION = 2
+
+
+def _pack(ids) -> bytes:
+    return np.asarray(ids, dtype=np.uint32).tobytes()
+
+
+def _unpack(blob: bytes | None) -> np.ndarray:
+    return np.frombuffer(blob or b"", dtype=np.uint32)
+
+
+def _invert(files: list[tuple[int, bytes]]) -> dict[int, np.ndarray]:
+    """word id -> sorted ids of the files containing it, from (file id, packed word ids) pairs."""
+    if not files:
+        return {}
+    words = [_unpack(blob) for _, blob in files]
+    file_ids = np.repeat(
+        np.array([file_id for file_id, _ in files], dtype=np.uint32), [len(w) for w in words]
+    )
+    words = np.concatenate(words)
+    if not len(words):
+        return {}
+    order = np.lexsort((file_ids, words))
+    words, file_ids = words[order], file_ids[order]
+    starts = np.flatnonzero(np.diff(words)) + 1
+    return dict(zip(words[np.r_[0, starts]].tolist(), np.split(file_ids, starts)))
+
+
+def looks_binary(head: bytes) -> bool:
+    """Same heuristic as git: a NUL byte near the start means binary."""
+    return b"\0" in head
+
+
+def walk_files(start_path: str) -> Iterator[tuple[str, os.stat_result]]:
+    """Yield (path, stat) for the regular files under start_path, honouring IGNORED_NAMES."""
+    for root, dirs, files in os.walk(start_path):
+        dirs[:] = [d for d in dirs if d not in IGNORED_NAMES]
+        for name in files:
+            if name in IGNORED_NAMES:
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat
+
+
+def read_text(path: str) -> str | None:
+    """Decode a file the way topic search always has, or None if it is binary or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if looks_binary(data[:SNIFF_BYTES]):
+        return None
+    # Stesso risultato di open(path, "r", encoding="utf-8", errors="ignore").read()
+    return data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ContentIndex:
+    """
+    On-disk full-text index of the text files under a folder.
+
+    Every file is recorded with its size and mtime, so refresh() only reads
+    files that are new or changed and drops deleted ones; binary files,
+    ignored folders and oversized files are never read. Each distinct
+    lowercase word has one postings row holding the packed ids of the files
+    that contain it, and each file keeps the packed ids of its words so a
+    change can be taken back out of the postings.
+
+    A refresh collects the postings of all the files it reads in memory and
+    writes them in one batch, in the same transaction as the file records:
+    a cold build writes one row per word rather than one per word and file.
+
+    A topic is answered from the postings: the candidate files are those
+    containing, for every word of the topic, a word that includes it. Only
+    candidates are read back to confirm the exact substring match, so the
+    cost of a query follows the number of matches rather than the tree size.
+    """
+
+    def __init__(self, root: str = ".", path: str | None = None):
+        self.root = os.path.abspath(root)
+        if path is None:
+            # Un database per cartella indicizzata
+            digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:12]
+            path = os.path.join(CONTENT_INDEX_DIR, f"content_index_{digest}.sqlite3")
+        self.path = path
+        self.refreshed = 0.0
+        self._lock = threading.Lock()
+        self._words: dict[str, int] = {}
+        self._new_words: list[tuple[int, str]] = []
+        self._build_lock = threading.Lock()
+        self._build_thread = None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Indice creato da una versione precedente: si ricostruisce da zero
+            self._conn.executescript(
+                """
+                DROP TABLE IF EXISTS postings;
+                DROP TABLE IF EXISTS words;
+                DROP TABLE IF EXISTS files;
+                """
+            )
+        self._conn.executescript(
+            f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            PRAGMA cache_size = -65536;
+            PRAGMA user_version = {SCHEMA_VERSION};
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                indexed INTEGER NOT NULL,
+                words BLOB
+            );
+            CREATE TABLE IF NOT EXISTS words (
+                id INTEGER PRIMARY KEY,
+                word TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                word_id INTEGER PRIMARY KEY,
+                file_ids BLOB NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._built = self._conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is not None
+
+    def _word_ids(self, words: set) -> list[int]:
+        # Gli ID sono assegnati qui, con la tabella delle parole in memoria durante il refresh;
+        # le parole nuove sono scritte tutte insieme alla fine
+        for word in words.difference(self._words):
+            word_id = self._words[word] = len(self._words) + 1
+            self._new_words.append((word_id, word))
+        return list(map(self._words.get, words))
+
+    def _index_file(
+        self, path: str, stat: os.stat_result, file_id: int | None
+    ) -> tuple[int, bytes | None]:
+        text = read_text(path) if stat.st_size <= MAX_FILE_BYTES else None
+        word_ids = None
+        if text is not None:
+            word_ids = _pack(self._word_ids(set(_WORD_PATTERN.findall(text.lower()))))
+        if file_id is None:
+            file_id = self._conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, indexed, words) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, int(text is not None), word_ids),
+            ).lastrowid
+        else:
+            self._conn.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, indexed = ?, words = ? WHERE id = ?",
+                (stat.st_size, stat.st_mtime_ns, int(text is not None), word_ids, file_id),
+            )
+        return file_id, word_ids
+
+    def _indexed_words(self, file_id: int) -> tuple[int, bytes | None]:
+        row = self._conn.execute("SELECT words FROM files WHERE id = ?", (file_id,)).fetchone()
+        return file_id, row[0] if row else None
+
+    def _write_postings(self, added: list[tuple[int, bytes]], removed: list[tuple[int, bytes]]):
+        """Apply the (file id, packed word ids) added and removed by a refresh to the postings."""
+        added, removed = _invert(added), _invert(removed)
+        # Solo le liste delle parole toccate dal refresh vengono riscritte; quelle
+        # delle parole nuove non esistono ancora e non vanno lette
+        word_ids = sorted(set(added) | set(removed))
+        new_ids = {word_id for word_id, _ in self._new_words}
+        stored = [word_id for word_id in word_ids if word_id not in new_ids]
+        existing = {}
+        for start in range(0, len(stored), 500):
+            batch = stored[start : start + 500]
+            existing.update(
+                self._conn.execute(
+                    f"SELECT word_id, file_ids FROM postings WHERE word_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+            )
+        rows, emptied = [], []
+        for word_id in word_ids:
+            file_ids = _unpack(existing.get(word_id))
+            if word_id in removed:
+                file_ids = file_ids[~np.isin(file_ids, removed[word_id])]
+            if word_id in added:
+                file_ids = np.union1d(file_ids, added[word_id]) if len(file_ids) else added[word_id]
+            if len(file_ids):
+                rows.append((word_id, file_ids.tobytes()))
+            else:
+                emptied.append((word_id,))
+        self._conn.executemany("INSERT INTO words (id, word) VALUES (?, ?)", self._new_words)
+        self._conn.executemany("INSERT OR REPLACE INTO postings (word_id, file_ids) VALUES (?, ?)", rows)
+        self._conn.executemany("DELETE FROM postings WHERE word_id = ?", emptied)
+
+    def refresh(self, max_age: float = 0.0) -> dict[str, int]:
+        """
+        Bring the index up to date with the files on disk.
+
+        Skipped entirely if the last refresh is more recent than max_age
+        seconds. Returns counts of indexed, unchanged and removed files.
+        """
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+        with self._lock:
+            if max_age and time.time() - self.refreshed < max_age:
+                return counts
+
+            self._words = dict(self._conn.execute("SELECT word, id FROM words"))
+            self._new_words = []
+            known = {
+                path: (file_id, size, mtime_ns)
+                for file_id, path, size, mtime_ns in self._conn.execute(
+                    "SELECT id, path, size, mtime_ns FROM files"
+                )
+            }
+            # (file, parole) da aggiungere e da togliere dalle postings, scritte alla fine
+            added, removed = [], []
+            try:
+                for path, stat in walk_files(self.root):
+                    previous = known.pop(path, None)
+                    if previous is not None and previous[1:] == (stat.st_size, stat.st_mtime_ns):
+                        counts["unchanged"] += 1
+                        continue
+                    if previous is not None:
+                        removed.append(self._indexed_words(previous[0]))
+                    added.append(self._index_file(path, stat, previous[0] if previous else None))
+                    counts["indexed"] += 1
+
+                for file_id, _, _ in known.values():
+                    removed.append(self._indexed_words(file_id))
+                    self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                    counts["removed"] += 1
+
+                self._write_postings(added, removed)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                self._words, self._new_words = {}, []
+            self.refreshed = time.time()
+            self._built = True
+        return counts
+
+    def ready(self) -> bool:
+        """
+        True once the index has been built at least once.
+
+        Until then, the first call starts the build in a background thread
+        (again if a previous attempt failed) and returns False at once.
+        """
+        with self._build_lock:
+            if self._built:
+                return True
+            if self._build_thread is None or not self._build_thread.is_alive():
+                self._build_thread = threading.Thread(
+                    target=self.refresh, name="content-index", daemon=True
+                )
+                self._build_thread.start()
+            return False
+
+    def _candidates(self, topic: str) -> list[str] | None:
+        parts = _WORD_PATTERN.findall(topic)
+        if not parts:
+            return None
+
+        # Dove può cadere ciascuna parola dell'argomento dentro una parola del testo:
+        # le parole interne sono intere, la prima è un suffisso e l'ultima un prefisso
+        conditions, params = [], []
+        for i, part in enumerate(parts):
+            first, last = i == 0, i == len(parts) - 1
+            if first and last:
+                conditions.append("instr(word, ?) > 0")
+                params.append((part,))
+            elif first:
+                conditions.append("substr(word, -length(?)) = ?")
+                params.append((part, part))
+            elif last:
+                conditions.append("word >= ? AND word < ?")
+                params.append((part, part + "\U0010ffff"))
+            else:
+                conditions.append("word = ?")
+                params.append((part,))
+
+        file_ids = None
+        for condition, condition_params in zip(conditions, params):
+            part_files = set()
+            for (blob,) in self._conn.execute(
+                f"SELECT file_ids FROM words JOIN postings ON postings.word_id = words.id WHERE {condition}",
+                condition_params,
+            ):
+                part_files.update(_unpack(blob).tolist())
+            file_ids = part_files if file_ids is None else file_ids & part_files
+            if not file_ids:
+                return []
+
+        paths = []
+        file_ids = sorted(file_ids)
+        for start in range(0, len(file_ids), 500):
+            batch = file_ids[start : start + 500]
+            paths.extend(
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT path FROM files WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+        return sorted(paths)
+
+    def search(self, topic: str) -> list[tuple[str, str]]:
+        """
+        (path, content) of every file whose name or text contains topic, case-insensitively.
+
+        Call refresh() first for results that reflect recent changes.
+        """
+        topic = topic.lower()
+        with self._lock:
+            candidates = self._candidates(topic)
+            paths = [row[0] for row in self._conn.execute("SELECT path FROM files ORDER BY path")]
+
+        if candidates is None:
+            # Argomento senza parole: nessun aiuto dall'indice, si verificano tutti i file
+            candidates = paths
+        by_name = [p for p in paths if topic in os.path.basename(p).lower()]
+        candidates = sorted(set(candidates) | set(by_name))
+        by_name = set(by_name)
+
+        matches = []
+        for path in candidates:
+            content = read_text(path)
+            if content is None:
+                if path in by_name:
+                    # Nome corrispondente: il file è incluso anche se non testuale, come prima
+                    try:
+                        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                            matches.append((path, f.read()))
+                    except OSError as e:
+                        print(f"Impossibile leggere il file {path}: {e}")
+                continue
+            if path in by_name or topic in content.lower():
+                matches.append((path, content))
+        return matches
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, indexed = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(indexed), 0) FROM files"
+            ).fetchone()
+            words = self._conn.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+        return {"files": files, "indexed": indexed, "words": words}
+
+
+_indexes: dict[str, ContentIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_content_index(root: str = ".") -> ContentIndex:
+    """Shared index for a folder, opened on first use."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = ContentIndex(root)
+        return index
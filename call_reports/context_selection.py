@@ -0,0 +1,163 @@
+import math
+import re
+from collections import Counter
+from itertools import pairwise
+
+# Paragraphs longer than this are split further, so one huge block cannot take the whole budget
+MAX_PASSAGE_CHARS = 2000
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Placed between two selected passages that were not adjacent in the source
+GAP_MARKER = "\n\n[...]\n\n"
+
+_WORD_PATTERN = re.compile(r"\w+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def split_passages(text: str, max_chars: int = MAX_PASSAGE_CHARS) -> list[str]:
+    """Split text into paragraphs, breaking overlong ones at line ends (or hard, as a last resort)."""
+    passages = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            passages.append(paragraph)
+            continue
+        current = ""
+        for line in paragraph.split("\n"):
+            while len(line) > max_chars:
+                if current:
+                    passages.append(current)
+                    current = ""
+                passages.append(line[:max_chars])
+                line = line[max_chars:]
+            if current and len(current) + 1 + len(line) > max_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current.strip():
+            passages.append(current)
+    return passages
+
+
+def bm25_scores(query: str, passages: list[str]) -> list[float]:
+    """Okapi BM25 score of each passage against the words of query."""
+    terms = set(tokenize(query))
+    if not terms or not passages:
+        return [0.0] * len(passages)
+
+    counts = [Counter(tokenize(p)) for p in passages]
+    lengths = [sum(c.values()) for c in counts]
+    average = sum(lengths) / len(lengths) or 1.0
+    n = len(passages)
+    idf = {}
+    for term in terms:
+        df = sum(1 for c in counts if term in c)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    scores = []
+    for c, length in zip(counts, lengths):
+        score = 0.0
+        for term in terms:
+            tf = c.get(term, 0)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                score += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def select_context(
+    topic: str,
+    file_contents: list[str],
+    call_logs: list[str],
+    max_tokens: int,
+    chars_per_token: int = 4,
+) -> tuple[list[str], list[str], dict[str, int]]:
+    """
+    Keep the passages of the files and call logs most relevant to topic, within max_tokens.
+
+    Every source is split into paragraphs, which are ranked by BM25 against
+    the topic; the best ones are taken until the budget is spent. Passages
+    that score the same (e.g. none mention the topic) are taken round-robin
+    across sources, from the start of each. The selected passages are put
+    back in their original order, with a marker where something was left
+    out, and sources with nothing selected are dropped.
+
+    If everything fits, the inputs are returned unchanged.
+
+    Returns:
+        The selected file contents and call logs, and a dict with the
+        input, selected and dropped sizes in bytes and the passage counts.
+    """
+    sources = list(file_contents) + list(call_logs)
+    input_bytes = sum(_size(s) for s in sources)
+    budget = max_tokens * chars_per_token
+    if sum(len(s) for s in sources) <= budget:
+        stats = {
+            "input_bytes": input_bytes,
+            "selected_bytes": input_bytes,
+            "dropped_bytes": 0,
+            "passages": 0,
+            "selected_passages": 0,
+        }
+        return list(file_contents), list(call_logs), stats
+
+    # (source, posizione nella fonte, testo)
+    passages = [(s, i, text) for s, source in enumerate(sources) for i, text in enumerate(split_passages(source))]
+    scores = bm25_scores(topic, [text for _, _, text in passages])
+    ranked = sorted(range(len(passages)), key=lambda k: (-scores[k], passages[k][1], passages[k][0]))
+
+    chosen = set()
+    used = 0
+    for k in ranked:
+        length = len(passages[k][2]) + len(GAP_MARKER)
+        if used + length > budget:
+            # Un passaggio troppo lungo non blocca quelli più corti che seguono
+            continue
+        chosen.add(k)
+        used += length
+
+    selected: list[list[tuple[int, str]]] = [[] for _ in sources]
+    for k in sorted(chosen):
+        s, i, text = passages[k]
+        selected[s].append((i, text))
+
+    texts = []
+    selected_bytes = 0
+    for parts in selected:
+        if not parts:
+            texts.append(None)
+            continue
+        pieces = [parts[0][1]]
+        for (previous, _), (i, text) in pairwise(parts):
+            pieces.append(GAP_MARKER if i != previous + 1 else "\n\n")
+            pieces.append(text)
+        if parts[0][0] != 0:
+            pieces.insert(0, "[...]\n\n")
+        texts.append("".join(pieces))
+        selected_bytes += sum(_size(text) for _, text in parts)
+
+    stats = {
+        "input_bytes": input_bytes,
+        "selected_bytes": selected_bytes,
+        "dropped_bytes": input_bytes - selected_bytes,
+        "passages": len(passages),
+        "selected_passages": len(chosen),
+    }
+    n_files = len(file_contents)
+    return (
+        [t for t in texts[:n_files] if t is not None],
+        [t for t in texts[n_files:] if t is not None],
+        stats,
+    )
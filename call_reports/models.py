@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Literal
+
 from bson import ObjectId
+from pydantic import BaseModel, Field
 
 
 class PyObjectId(ObjectId):
@@ -34,7 +35,7 @@ class PyObjectId(ObjectId):
 
 
 class Report(BaseModel):
-    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId | None = Field(default_factory=PyObjectId, alias="_id")
     date: str
     topic: str
     content: str
@@ -58,10 +59,10 @@ class Report(BaseModel):
 
 
 class CallLog(BaseModel):
-    id: Optional[PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId | None = Field(default_factory=PyObjectId, alias="_id")
     date: str
     topic: str
-    participants: List[str]
+    participants: list[str]
     report: str
 
     model_config = {
@@ -77,3 +78,22 @@ class CallLog(BaseModel):
             }
         },
     }
+
+
+class TopicBatchQuery(BaseModel):
+    topics: list[str]
+    include: list[Literal["reports", "call_logs"]] = ["reports", "call_logs"]
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "topics": ["Team Meeting", "Budget Review"],
+                "include": ["reports", "call_logs"],
+            }
+        },
+    }
+
+
+class TopicBatchResult(BaseModel):
+    reports: dict[str, list[Report]] = {}
+    call_logs: dict[str, list[CallLog]] = {}
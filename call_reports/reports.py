@@ -1,26 +1,79 @@
-from typing import List, Optional, Tuple
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 import os
-import requests
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
+from urllib.parse import quote
+
+from googleapiclient.errors import HttpError
 
 # Add the parent directory to sys.path to import synthesizer
 parent_dir = str(Path(__file__).parent.parent)
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
     
-from synthesizer import synthesize_report_content
+from call_reports.api_client import get_api_client
+from call_reports.calendar_client import get_calendar_client
+from call_reports.content_index import get_content_index
+from call_reports.context_selection import select_context
+from call_reports.scanner import scan_topics
+from synthesizer import CHARS_PER_TOKEN, synthesize_report_content
+
+# Topic searches within this many seconds reuse the content index without rescanning
+CONTENT_INDEX_MAX_AGE = 60
+
+# Token budget for the files and call logs sent to the report synthesis; only
+# the passages most relevant to the topic are kept beyond it
+REPORT_CONTEXT_TOKENS = int(os.getenv("REPORT_CONTEXT_TOKENS", "24000"))
+
+# Events prepared at the same time by create_report (the calendar returns at most 10)
+REPORT_MAX_WORKERS = 10
 
-SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 
+def _read_file(file_path: str) -> str | None:
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    except Exception as e:
+        print(f"Impossibile leggere il file {file_path}: {e}")
+        return None
 
-def find_files_with_topic(topic: str, start_path: str = '.') -> List[str]:
+
+def find_files_with_topics(topics: list[str], start_path: str = '.') -> dict[str, list[str]]:
+    """
+    Contents of the files containing each topic in either filename or content.
+
+    Topics are answered from the full-text content index of start_path, which
+    is brought up to date once for all of them (only new or changed files are
+    read). Until the index has been built for the first time, the tree is
+    walked once with the parallel scanner instead. Binary files and ignored
+    folders such as .git and .venv are not searched.
+
+    Args:
+        topics (List[str]): The topics to search for
+        start_path (str): Directory where to start the search (default: current directory)
+
+    Returns:
+        dict: For each topic, the contents of the matching files
+    """
+    topics = list(dict.fromkeys(topics))
+    if not topics:
+        return {}
+    index = get_content_index(start_path)
+    if not index.ready():
+        found = {}
+        for topic, paths in scan_topics(topics, start_path).items():
+            contents = (_read_file(path) for path in paths)
+            found[topic] = [content for content in contents if content is not None]
+        return found
+
+    counts = index.refresh(max_age=CONTENT_INDEX_MAX_AGE)
+    if counts["indexed"] or counts["removed"]:
+        print(f"Indice dei contenuti aggiornato: {counts}")
+    return {topic: [content for _, content in index.search(topic)] for topic in topics}
+
+
+def find_files_with_topic(topic: str, start_path: str = '.') -> list[str]:
     """
     Find contents of all files containing 'topic' in either filename or content.
 
@@ -31,72 +84,28 @@ def find_files_with_topic(topic: str, start_path: str = '.') -> List[str]:
     Returns:
         list: List of strings containing the contents of matching files
     """
-    contents_list = []
-    
-    for root, _, files in os.walk(start_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            
-            if topic.lower() in file.lower():
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        contents_list.append(f.read())
-                except Exception as e:
-                    print(f"Impossibile leggere il file {file_path}: {e}")
-            else:
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        if topic.lower() in content.lower():
-                            contents_list.append(content)
-                except Exception as e:
-                    pass
-    return contents_list
+    return find_files_with_topics([topic], start_path)[topic]
 
 
 def fetch_topics_from_calendar():
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
+    """
+    (start, summary) of the events in the next 24 hours, or None if there are none.
+
+    Events come from the shared calendar client, which syncs incrementally
+    and answers repeated calls from its local store.
+    """
     try:
-        service = build("calendar", "v3", credentials=creds)
-        now = datetime.now(tz=timezone.utc)
-        now_iso = now.isoformat()
-        time_max = (now + timedelta(hours=24)).isoformat()
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=now_iso,
-                timeMax=time_max,
-                maxResults=10,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
-        if not events:
-            print("No upcoming events found.")
-            return
-        topics = []
-        for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            topics.append((start, event["summary"]))
-        return topics
+        topics = get_calendar_client().upcoming(hours=24, limit=10)
     except HttpError as error:
         print(f"An error occurred: {error}")
+        return None
+    if not topics:
+        print("No upcoming events found.")
+        return None
+    return topics
 
 
-def get_call_logs_by_topic(topic: str) -> List[str]:
+def get_call_logs_by_topic(topic: str) -> list[str]:
     """
     Retrieve call logs from the API by topic.
     
@@ -107,7 +116,7 @@ def get_call_logs_by_topic(topic: str) -> List[str]:
         List[str]: List of call log reports
     """
     try:
-        response = requests.get(f"http://localhost:8000/call-logs/topic/{topic}")
+        response = get_api_client().get(f"/call-logs/topic/{quote(topic, safe='')}")
         if response.status_code == 200:
             call_logs = response.json()
             return [log.get("report", "") for log in call_logs]
@@ -119,7 +128,7 @@ def get_call_logs_by_topic(topic: str) -> List[str]:
         return []
 
 
-def get_reports_by_topic(topic: str) -> List[str]:
+def get_reports_by_topic(topic: str) -> list[str]:
     """
     Retrieve reports from the API by topic.
     
@@ -130,7 +139,7 @@ def get_reports_by_topic(topic: str) -> List[str]:
         List[str]: List of reports
     """
     try:
-        response = requests.get(f"http://localhost:8000/reports/topic/{topic}")
+        response = get_api_client().get(f"/reports/topic/{quote(topic, safe='')}")
         if response.status_code == 200:
             reports = response.json()
             return [report.get("content", "") for report in reports]
@@ -142,7 +151,32 @@ def get_reports_by_topic(topic: str) -> List[str]:
         return []
 
 
-def parse_datetime(dt_string: str) -> Optional[datetime]:
+def get_topics_material(topics: list[str]) -> dict[str, dict[str, list]]:
+    """
+    Retrieve the stored reports and call logs of many topics with a single API request.
+
+    Args:
+        topics (List[str]): The topics to search for
+
+    Returns:
+        dict: {"reports": {topic: [report documents]}, "call_logs": {topic: [call log documents]}},
+        with empty groups if the request failed
+    """
+    topics = list(dict.fromkeys(topics))
+    empty = {"reports": {t: [] for t in topics}, "call_logs": {t: [] for t in topics}}
+    if not topics:
+        return empty
+    try:
+        material = get_api_client().topics_batch(topics)
+    except Exception as e:
+        print(f"Error retrieving reports and call logs: {e}")
+        return empty
+    for group in empty:
+        empty[group].update(material.get(group, {}))
+    return empty
+
+
+def parse_datetime(dt_string: str) -> datetime | None:
     """
     Parse the datetime string from Google Calendar API.
     
@@ -159,6 +193,101 @@ def parse_datetime(dt_string: str) -> Optional[datetime]:
         return None
 
 
+def save_reports(reports: list[tuple[str, str, datetime | None]]) -> bool:
+    """
+    Store synthesized reports in the reports collection with a single API request.
+
+    Args:
+        reports: (topic, content, event start time) of each report
+
+    Returns:
+        bool: True if all the reports were saved
+    """
+    if not reports:
+        return True
+    now = datetime.now()
+    report_data = [
+        {
+            "date": now.strftime("%Y-%m-%d"),
+            "topic": topic,
+            "content": content,
+            "timestamp_expected": start_time.strftime("%H:%M") if start_time else "",
+            "timestamp_actual": now.strftime("%H:%M"),
+        }
+        for topic, content, start_time in reports
+    ]
+
+    try:
+        response = get_api_client().post("/reports/batch", json=report_data)
+        if response.status_code == 201:
+            ids = [report.get("_id") for report in response.json()]
+            print(f"Reports saved to database with IDs: {ids}")
+            return True
+        print(f"Failed to save reports: HTTP {response.status_code}")
+    except Exception as e:
+        print(f"Error saving reports to database: {e}")
+    return False
+
+
+def prepare_topic_report(topic: str, files: list[str], call_logs: list[str] | None = None) -> str | None:
+    """
+    Synthesize the report for a topic from its files and call logs.
+
+    The call logs are requested from the API unless given.
+    Returns None when neither files nor call logs were found.
+    """
+    if call_logs is None:
+        call_logs = get_call_logs_by_topic(topic)
+    if not files and not call_logs:
+        print(f"No files or call logs found for topic: {topic}")
+        return None
+
+    files, call_logs, context = select_context(
+        topic, files, call_logs, REPORT_CONTEXT_TOKENS, CHARS_PER_TOKEN
+    )
+    if context["dropped_bytes"]:
+        print(
+            f"Contesto per {topic}: inviati {context['selected_bytes']} byte su "
+            f"{context['input_bytes']} ({context['dropped_bytes']} scartati, "
+            f"{context['selected_passages']}/{context['passages']} passaggi)"
+        )
+    synthesis = synthesize_report_content(files, call_logs)
+    print(f"Synthesis generated for {topic}: {len(synthesis)} characters")
+    return synthesis
+
+
+def _prepare_event(
+    topic: str, time_diff: timedelta, files_future: Future, material_future: Future
+) -> tuple[str | None, str | None]:
+    """
+    Prepare one calendar event; returns its summary line and the text to notify, if any.
+
+    files_future and material_future hold the file search and the API batch
+    request shared by all the events being prepared. A synthesized report
+    comes back with no summary line: it is saved together with the others.
+    """
+    # For events more than 60 minutes in the future
+    if time_diff >= timedelta(minutes=60):
+        print(f"Preparing comprehensive report for: {topic}")
+        call_logs = [log.get("report", "") for log in material_future.result()["call_logs"].get(topic, [])]
+        synthesis = prepare_topic_report(topic, files_future.result().get(topic, []), call_logs)
+        if synthesis is None:
+            return f"ℹ️ Nessun file o registro chiamate trovato per '{topic}'", None
+        return None, synthesis
+
+    # For events between 30-60 minutes in the future
+    if time_diff >= timedelta(minutes=30):
+        print(f"Retrieving quick reference reports for: {topic}")
+        reports = [report.get("content", "") for report in material_future.result()["reports"].get(topic, [])]
+        if reports:
+            print(f"Found {len(reports)} existing reports for {topic}")
+            return f"📑 Trovati {len(reports)} report esistenti per '{topic}' (tra {time_diff})", reports[0]
+        print(f"No existing reports found for topic: {topic}")
+        return f"ℹ️ Nessun report esistente per '{topic}' (tra {time_diff})", None
+
+    return None, None
+
+
 def create_report(notification_callback=None):
     """
     Create reports for upcoming calendar events based on their start time.
@@ -169,6 +298,12 @@ def create_report(notification_callback=None):
     
     For events starting in more than 30 minutes (but less than 60):
     - Retrieve existing reports for quick review
+
+    Events are prepared concurrently on a bounded thread pool. The file
+    search and the API lookup of stored reports and call logs are done once
+    for all topics, and the new reports are saved with a single request, so
+    the whole run takes about as long as the slowest event. Summaries keep
+    the calendar order.
     
     Args:
         notification_callback (callable, optional): Function to call with the synthesis content
@@ -184,81 +319,59 @@ def create_report(notification_callback=None):
     current_time = datetime.now().astimezone()  # Current time with timezone info
     print(f"Current time: {current_time}")
     print(f"Found {len(topics)} upcoming events")
-    
-    # Teniamo traccia dello stato di generazione dei report
-    report_summary = []
-    
-    # Per la notifica, useremo il contenuto del primo report significativo
-    first_synthesis = None
-    
+
+    events = []
     for start_str, topic in topics:
         start_time = parse_datetime(start_str)
         if not start_time:
             continue
-        
         time_diff = start_time - current_time
         print(f"Event: {topic} starting at {start_time} (in {time_diff})")
-        
-        # For events more than 60 minutes in the future
-        if time_diff >= timedelta(minutes=60):
-            print(f"Preparing comprehensive report for: {topic}")
-            files = find_files_with_topic(topic)
-            call_logs = get_call_logs_by_topic(topic)
-            
-            if files or call_logs:
-                synthesis = synthesize_report_content(files, call_logs)
-                print(f"Synthesis generated for {topic}: {len(synthesis)} characters")
-                
-                # Salva il primo report significativo per la notifica
-                if first_synthesis is None:
-                    first_synthesis = synthesis
-                
-                # Create a Report object and save it to the database
-                current_date = datetime.now().strftime("%Y-%m-%d")
-                expected_time = start_time.strftime("%H:%M")
-                actual_time = datetime.now().strftime("%H:%M")
-                
-                report_data = {
-                    "date": current_date,
-                    "topic": topic,
-                    "content": synthesis,
-                    "timestamp_expected": None,
-                    "timestamp_actual": None
-                }
-                
-                try:
-                    response = requests.post(
-                        "http://localhost:8000/reports",
-                        json=report_data,
-                        headers={"Content-Type": "application/json"}
-                    )
-                    if response.status_code == 201:
-                        print(f"Report saved to database with ID: {response.json().get('_id')}")
-                        report_summary.append(f"☑️ Creato report per '{topic}' (tra {time_diff})")
-                    else:
-                        print(f"Failed to save report: HTTP {response.status_code}")
-                        report_summary.append(f"❌ Errore nel salvare il report per '{topic}'")
-                except Exception as e:
-                    print(f"Error saving report to database: {e}")
-                    report_summary.append(f"❌ Errore nel salvare il report per '{topic}': {str(e)}")
-            else:
-                print(f"No files or call logs found for topic: {topic}")
-                report_summary.append(f"ℹ️ Nessun file o registro chiamate trovato per '{topic}'")
-        
-        # For events between 30-60 minutes in the future
-        elif time_diff >= timedelta(minutes=30):
-            print(f"Retrieving quick reference reports for: {topic}")
-            reports = get_reports_by_topic(topic)
-            if reports:
-                print(f"Found {len(reports)} existing reports for {topic}")
-                report_summary.append(f"📑 Trovati {len(reports)} report esistenti per '{topic}' (tra {time_diff})")
-                
-                # Se non abbiamo ancora un report significativo, usa il primo report esistente
-                if first_synthesis is None and reports:
-                    first_synthesis = reports[0]
+        events.append((topic, start_time, time_diff))
+
+    search_topics = [topic for topic, _, time_diff in events if time_diff >= timedelta(minutes=60)]
+    api_topics = [topic for topic, _, time_diff in events if time_diff >= timedelta(minutes=30)]
+    workers = max(1, min(REPORT_MAX_WORKERS, len(events)))
+    # Ricerca dei file e richiesta all'API hanno i propri thread: ogni evento ha un worker tutto per sé
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="report-lookup") as lookups, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as executor:
+        files_future = lookups.submit(find_files_with_topics, search_topics)
+        material_future = lookups.submit(get_topics_material, api_topics)
+        futures = [
+            executor.submit(_prepare_event, topic, time_diff, files_future, material_future)
+            for topic, _, time_diff in events
+        ]
+
+        results = []
+        for future, (topic, _, _) in zip(futures, events):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error preparing report for {topic}: {e}")
+                results.append((f"❌ Errore nella preparazione del report per '{topic}': {e}", None))
+
+    # I report sintetizzati sono salvati tutti insieme, con una sola richiesta
+    to_save = [
+        (topic, synthesis, start_time)
+        for (topic, start_time, _), (line, synthesis) in zip(events, results)
+        if line is None and synthesis
+    ]
+    saved = save_reports(to_save)
+
+    # Teniamo traccia dello stato di generazione dei report
+    report_summary = []
+    # Per la notifica, useremo il contenuto del primo report significativo
+    first_synthesis = None
+    for (topic, _, time_diff), (line, synthesis) in zip(events, results):
+        if line is None and synthesis:
+            if saved:
+                line = f"☑️ Creato report per '{topic}' (tra {time_diff})"
             else:
-                print(f"No existing reports found for topic: {topic}")
-                report_summary.append(f"ℹ️ Nessun report esistente per '{topic}' (tra {time_diff})")
+                line = f"❌ Errore nel salvare il report per '{topic}'"
+        if line:
+            report_summary.append(line)
+        if first_synthesis is None and synthesis:
+            first_synthesis = synthesis
     
     # Crea un riassunto completo per il log
     summary = "\n".join(report_summary)
@@ -274,4 +387,4 @@ def create_report(notification_callback=None):
             notification_message = f"📋 Report per: {event_topic}\n\n{first_synthesis}"
             notification_callback(notification_message)
     
-    return final_summary
\ No newline at end of file
+    return final_summary
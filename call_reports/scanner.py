@@ -0,0 +1,141 @@
+import mmap
+import os
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+from call_reports.content_index import (
+    MAX_FILE_BYTES,
+    SNIFF_BYTES,
+    looks_binary,
+    walk_files,
+)
+
+# Below this many files the scan runs in-process: starting workers would cost more
+MIN_PARALLEL_FILES = 256
+CHUNK_FILES = 64
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_needles: dict[str, list[bytes] | None] = {}
+
+# Files are lowercased and searched in windows of this size, never all at once
+WINDOW_BYTES = 1024 * 1024
+# Topics with more non-ASCII case combinations than this are matched by decoding
+MAX_NEEDLES = 16
+
+
+def topic_needles(topic: str) -> list[bytes] | None:
+    """
+    Byte strings whose presence in the ASCII-lowercased file means the topic is there.
+
+    bytes.lower() only folds ASCII, so each non-ASCII letter of the topic is
+    expanded into the UTF-8 encodings of its case variants ("città" gives
+    b"citt\\xc3\\xa0" and b"citt\\xc3\\x80"). Returns None when there would be
+    more than MAX_NEEDLES combinations.
+    """
+    needles = [b""]
+    for c in topic.lower():
+        if c.isascii():
+            variants = [c]
+        else:
+            variants = sorted({v for v in (c, c.upper(), c.title()) if len(v) == 1 and v.lower() == c})
+        needles = [n + v.encode("utf-8") for n in needles for v in variants]
+        if len(needles) > MAX_NEEDLES:
+            return None
+    return needles
+
+
+def _topic_needles(topic: str) -> list[bytes] | None:
+    if topic not in _needles:
+        _needles[topic] = topic_needles(topic)
+    return _needles[topic]
+
+
+def _contains(data, topic: str) -> bool:
+    needles = _topic_needles(topic)
+    if needles is None:
+        return topic.lower() in data[:].decode("utf-8", errors="ignore").lower()
+    overlap = max(len(n) for n in needles) - 1
+    for start in range(0, len(data), WINDOW_BYTES):
+        window = data[start : start + WINDOW_BYTES + overlap].lower()
+        if any(n in window for n in needles):
+            return True
+    return False
+
+
+def _scan_file(path: str, size: int, topics: Sequence[str]) -> list[int]:
+    """Indices of the topics found in the file's content (not its name)."""
+    if size == 0 or size > MAX_FILE_BYTES:
+        return []
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if looks_binary(data[:SNIFF_BYTES]):
+                return []
+            return [i for i, topic in enumerate(topics) if _contains(data, topic)]
+    except (OSError, ValueError):
+        return []
+
+
+def _scan_chunk(files: Sequence[tuple], topics: Sequence[str]) -> list[tuple]:
+    """Runs in a worker: (position, topic indices) for each file with a content match."""
+    found = []
+    for position, path, size in files:
+        hits = _scan_file(path, size, topics)
+        if hits:
+            found.append((position, hits))
+    return found
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Un solo pool riutilizzato: con spawn (Windows, macOS) avviare i worker è costoso
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, min(8, (os.cpu_count() or 2) - 1)))
+        return _pool
+
+
+def scan_topics(topics: Sequence[str], start_path: str = ".", parallel: bool | None = None) -> dict[str, list[str]]:
+    """
+    Paths of the files whose name or content contains each topic, case-insensitively.
+
+    The tree is walked once for all topics, skipping the same ignored names,
+    binary files and oversized files as the content index. Files are
+    memory-mapped and searched as bytes without being decoded, spread over a
+    process pool unless the tree is small or there is a single CPU. Paths come back in walk order, like the original
+    topic search.
+    """
+    topics = list(dict.fromkeys(topics))
+    lowered = [t.lower() for t in topics]
+    files = [(i, path, stat.st_size) for i, (path, stat) in enumerate(walk_files(start_path))]
+
+    matches = {t: set() for t in topics}
+    for position, path, _ in files:
+        name = os.path.basename(path).lower()
+        for topic, low in zip(topics, lowered):
+            if low in name:
+                matches[topic].add(position)
+
+    if parallel is None:
+        parallel = len(files) >= MIN_PARALLEL_FILES and (os.cpu_count() or 1) > 1
+    chunks = [files[i : i + CHUNK_FILES] for i in range(0, len(files), CHUNK_FILES)]
+    if parallel and chunks:
+        results = _get_pool().map(_scan_chunk, chunks, [topics] * len(chunks))
+    else:
+        results = (_scan_chunk(chunk, topics) for chunk in chunks)
+    for found in results:
+        for position, hits in found:
+            for i in hits:
+                matches[topics[i]].add(position)
+
+    return {t: [files[p][1] for p in sorted(positions)] for t, positions in matches.items()}
+
+
+def shutdown():
+    """Stop the worker processes (they are restarted on the next parallel scan)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,199 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from call_reports.reports import (
+    REPORT_MAX_WORKERS,
+    fetch_topics_from_calendar,
+    find_files_with_topics,
+    get_topics_material,
+    parse_datetime,
+    prepare_topic_report,
+    save_reports,
+)
+
+# How long before an event its report is prepared
+REPORT_LEAD_MINUTES = float(os.getenv("REPORT_LEAD_MINUTES", "60"))
+# How often the calendar is read again
+REPORT_POLL_SECONDS = float(os.getenv("REPORT_POLL_SECONDS", "300"))
+# A call starting this long after an event's start still belongs to that event
+CALL_LATE_MINUTES = 30
+
+
+class ReportScheduler:
+    """
+    Prepares the report of each upcoming calendar event ahead of time.
+
+    A background thread reads the calendar every poll_interval seconds (and
+    wakes up earlier when an event becomes due). An event is due lead_time
+    before it starts: its report is synthesized, saved in the reports
+    collection and kept in memory, so that when the call starts
+    current_report() returns it at once. A report already saved today for
+    the same topic (e.g. before a restart) is reused instead of being
+    synthesized again.
+    """
+
+    def __init__(
+        self,
+        lead_time: timedelta = timedelta(minutes=REPORT_LEAD_MINUTES),
+        poll_interval: float = REPORT_POLL_SECONDS,
+    ):
+        self.lead_time = lead_time
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._events: list[tuple[datetime, str]] = []
+        # (inizio, argomento) -> contenuto del report, None se non c'era materiale
+        self._ready: dict[tuple[datetime, str], str | None] = {}
+        # Eventi la cui preparazione è fallita -> quando riprovare
+        self._retry: dict[tuple[datetime, str], datetime] = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self):
+        """Start the background thread (once)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="report-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def refresh(self):
+        """Read the calendar again at the next opportunity."""
+        self._wake.set()
+
+    def _run(self):
+        next_fetch = datetime.now().astimezone()
+        while not self._stop_event.is_set():
+            now = datetime.now().astimezone()
+            try:
+                if now >= next_fetch or self._wake.is_set():
+                    self._wake.clear()
+                    self._fetch_events()
+                    next_fetch = now + timedelta(seconds=self.poll_interval)
+                self.run_due(now)
+            except Exception as e:
+                print(f"Errore nella preparazione anticipata dei report: {e}")
+                next_fetch = now + timedelta(seconds=self.poll_interval)
+            self._wake.wait(self._seconds_until_next(next_fetch))
+
+    def _fetch_events(self):
+        events = []
+        for start_str, topic in fetch_topics_from_calendar() or []:
+            start_time = parse_datetime(start_str)
+            if start_time is not None:
+                # Gli eventi di un'intera giornata non hanno fuso orario
+                events.append((start_time.astimezone(), topic))
+        with self._lock:
+            self._events = sorted(events)
+            # Dimentica i report degli eventi ormai passati
+            horizon = datetime.now().astimezone() - timedelta(hours=12)
+            self._ready = {key: value for key, value in self._ready.items() if key[0] >= horizon}
+            self._retry = {key: value for key, value in self._retry.items() if key[0] >= horizon}
+
+    def _seconds_until_next(self, next_fetch: datetime) -> float:
+        now = datetime.now().astimezone()
+        wait = (next_fetch - now).total_seconds()
+        with self._lock:
+            for start_time, topic in self._events:
+                due_at = self._retry.get((start_time, topic), start_time - self.lead_time)
+                if (start_time, topic) not in self._ready and due_at > now:
+                    wait = min(wait, (due_at - now).total_seconds())
+        return max(1.0, wait)
+
+    def _due(self, now: datetime) -> list[tuple[datetime, str]]:
+        late = timedelta(minutes=CALL_LATE_MINUTES)
+        with self._lock:
+            return [
+                (start_time, topic)
+                for start_time, topic in self._events
+                if (start_time, topic) not in self._ready
+                and start_time - self.lead_time <= now < start_time + late
+                and self._retry.get((start_time, topic), now) <= now
+            ]
+
+    def run_due(self, now: datetime | None = None) -> int:
+        """Prepare the reports of all the events that are due; returns how many were prepared."""
+        due = self._due(now or datetime.now().astimezone())
+        if not due:
+            return 0
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        material = get_topics_material([topic for _, topic in due])
+        missing = []
+        for key in due:
+            existing = [r for r in material["reports"].get(key[1], []) if r.get("date") == today]
+            if existing:
+                print(f"Report per '{key[1]}' già presente nel database")
+                with self._lock:
+                    self._ready[key] = existing[-1].get("content", "")
+            else:
+                missing.append(key)
+        if not missing:
+            return len(due)
+
+        files = find_files_with_topics([topic for _, topic in missing])
+        prepared = []
+        workers = min(REPORT_MAX_WORKERS, len(missing))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as executor:
+            futures = {}
+            for key in missing:
+                call_logs = [log.get("report", "") for log in material["call_logs"].get(key[1], [])]
+                futures[key] = executor.submit(prepare_topic_report, key[1], files.get(key[1], []), call_logs)
+            for key, future in futures.items():
+                try:
+                    synthesis = future.result()
+                except Exception as e:
+                    print(f"Errore nella preparazione del report per '{key[1]}': {e}")
+                    with self._lock:
+                        self._retry[key] = datetime.now().astimezone() + timedelta(seconds=self.poll_interval)
+                    continue
+                with self._lock:
+                    self._ready[key] = synthesis
+                    self._retry.pop(key, None)
+                if synthesis is not None:
+                    prepared.append((key[1], synthesis, key[0]))
+        save_reports(prepared)
+        return len(due)
+
+    def current_report(self, now: datetime | None = None) -> tuple[str, str] | None:
+        """
+        (topic, content) of the prepared report for the event closest to now, if any.
+
+        Only events starting within lead_time from now, or that started at most
+        CALL_LATE_MINUTES ago, are considered.
+        """
+        now = now or datetime.now().astimezone()
+        late = timedelta(minutes=CALL_LATE_MINUTES)
+        with self._lock:
+            candidates = [
+                (abs(start_time - now), topic, content)
+                for (start_time, topic), content in self._ready.items()
+                if content and now - late <= start_time <= now + self.lead_time
+            ]
+        if not candidates:
+            return None
+        _, topic, content = min(candidates)
+        return topic, content
+
+
+_scheduler: ReportScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_report_scheduler() -> ReportScheduler:
+    """Shared scheduler, created on first use (call start() to run it)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReportScheduler()
+        return _scheduler
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections.abc import Iterable
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from llm_providers import LLMProvider, provider_from_env
+
+# Load environment variables from .env file
+load_dotenv()
+
+DEFAULT_MODEL = "gemini-1.5-pro"
+
+# Clients warmed at startup: transcription/agent (temperature 0) and synthesis (0.2)
+WARM_UP_CONFIGS = ((DEFAULT_MODEL, 0.0), (DEFAULT_MODEL, 0.2))
+
+_lock = threading.Lock()
+_provider: LLMProvider | None = None
+_sync_clients: dict[tuple[str, float], BaseChatModel] = {}
+# Async clients are bound to the event loop that first uses them
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = (
+    weakref.WeakKeyDictionary()
+)
+_stats: dict[tuple[str, float], dict] = {}
+# Long-lived event loop for the synchronous entry points (see run_async)
+_shared_loop: asyncio.AbstractEventLoop | None = None
+_shared_loop_lock = threading.Lock()
+
+
+def _new_stats() -> dict:
+    return {"constructed": 0, "construct_s": 0.0, "hits": 0, "warmup_s": None}
+
+
+def get_provider() -> LLMProvider:
+    """Active provider, chosen from the environment on first use."""
+    global _provider
+    with _lock:
+        if _provider is None:
+            _provider = provider_from_env()
+        return _provider
+
+
+def set_provider(provider: LLMProvider):
+    """Switch provider (e.g. for offline benchmarks); clients already handed out keep theirs."""
+    global _provider
+    with _lock:
+        _provider = provider
+        _sync_clients.clear()
+        _loop_clients.clear()
+        _stats.clear()
+
+
+def get_llm(model: str = DEFAULT_MODEL, temperature: float = 0.0) -> BaseChatModel:
+    """
+    Return the shared client for (model, temperature), constructing it on first use.
+
+    The same client (and its underlying connection) is reused by every
+    caller. When called from a running event loop the client is scoped to
+    that loop, since async transports cannot be shared across loops.
+    """
+    key = (model, float(temperature))
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    provider = get_provider()
+    with _lock:
+        clients = _sync_clients if loop is None else _loop_clients.setdefault(loop, {})
+        stats = _stats.setdefault(key, _new_stats())
+        client = clients.get(key)
+        if client is not None:
+            stats["hits"] += 1
+            return client
+
+        started = time.perf_counter()
+        client = clients[key] = provider.create(model, temperature)
+        elapsed = time.perf_counter() - started
+        stats["constructed"] += 1
+        stats["construct_s"] += elapsed
+
+    print(f"Client LLM {provider.name}/{model} (temperature={temperature}) creato in {elapsed * 1000:.1f} ms")
+    return client
+
+
+def _get_shared_loop() -> asyncio.AbstractEventLoop:
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = asyncio.new_event_loop()
+            threading.Thread(target=_shared_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _shared_loop
+
+
+def run_async(coroutine):
+    """
+    Run a coroutine on the shared LLM event loop and wait for its result.
+
+    Async clients are scoped to the loop that created them, so a new loop
+    per call (asyncio.run) would rebuild them every time. Synchronous entry
+    points run on this one long-lived loop instead, which keeps its clients
+    and their connections across calls. Must not be called from the shared
+    loop itself; await the coroutine there.
+    """
+    loop = _get_shared_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("run_async called from the shared LLM loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+async def _get_async_llm(model: str, temperature: float) -> BaseChatModel:
+    return get_llm(model, temperature)
+
+
+def _warm_up(configs: Iterable[tuple[str, float]]):
+    for model, temperature in configs:
+        try:
+            llm = get_llm(model, temperature)
+            # The client of the shared loop, used by the async synthesis
+            run_async(_get_async_llm(model, temperature))
+            started = time.perf_counter()
+            # count_tokens is free and goes through auth, TLS and channel setup
+            llm.get_num_tokens("ping")
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            print(f"Riscaldamento del client LLM {model} fallito: {e}")
+            continue
+        with _lock:
+            _stats[(model, float(temperature))]["warmup_s"] = elapsed
+        print(f"Connessione LLM {model} pronta in {elapsed * 1000:.1f} ms")
+
+
+def warm_up(
+    configs: Iterable[tuple[str, float]] = WARM_UP_CONFIGS, background: bool = True
+) -> threading.Thread | None:
+    """Construct the usual clients and open their connections ahead of the first call."""
+    configs = tuple(configs)
+    if not background:
+        _warm_up(configs)
+        return None
+    thread = threading.Thread(target=_warm_up, args=(configs,), daemon=True)
+    thread.start()
+    return thread
+
+
+def client_stats() -> dict[str, dict]:
+    """Construction count/time, reuse hits and warm-up handshake time per client."""
+    with _lock:
+        return {
+            f"{model}@{temperature}": dict(stats)
+            for (model, temperature), stats in _stats.items()
+        }
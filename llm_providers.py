@@ -0,0 +1,356 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+RECORD_DIR = os.path.join("output", "llm_recordings")
+
+_FILE_NAME = re.compile(r"\b[\w\-]+\.[a-z]{2,4}\b")
+
+
+def _content_parts(content) -> list[Any]:
+    return content if isinstance(content, list) else [content]
+
+
+def request_digest(model: str, temperature: float, messages: list[BaseMessage], stop=None) -> str:
+    """Stable hash of everything that determines a chat completion."""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "stop": stop or [],
+        "messages": [[m.type, m.content] for m in messages],
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def _describe_messages(messages: list[BaseMessage]) -> list[dict]:
+    """Messages as JSON, with inline media replaced by its hash to keep recordings small."""
+    described = []
+    for message in messages:
+        parts = []
+        for part in _content_parts(message.content):
+            if isinstance(part, dict) and "data" in part:
+                part = dict(part)
+                part["data"] = "sha256:" + hashlib.sha256(part["data"].encode("utf-8")).hexdigest()
+            parts.append(part)
+        described.append({"type": message.type, "content": parts})
+    return described
+
+
+def _text(messages: list[BaseMessage]) -> str:
+    return "\n".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for m in messages
+        for part in _content_parts(m.content)
+        if isinstance(part, (str, dict))
+    )
+
+
+def _fraction(*values) -> float:
+    """Deterministic number in [0, 1) derived from the given values."""
+    digest = hashlib.sha256("\0".join(map(str, values)).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+_fake_lock = threading.Lock()
+_fake_attempts: dict[str, int] = {}
+_fake_stats = {"calls": 0, "errors": 0, "latency_s": 0.0}
+
+
+def fake_stats() -> dict:
+    """Calls, simulated errors and total simulated latency across all fake models."""
+    with _fake_lock:
+        return dict(_fake_stats)
+
+
+def _simulated_transcription(messages: list[BaseMessage], digest: str) -> str:
+    content = f"[trascrizione simulata {digest[:8]}] Aggiornamento sull'avanzamento del progetto."
+    if _fraction(digest, "file") < 0.25:
+        # Una parte dei segmenti cita un file, come in una riunione reale
+        content += " Apriamo il file budget.xlsx per controllare i numeri."
+    return content
+
+
+def _mentioned_files(messages: list[BaseMessage]) -> list[str]:
+    return _FILE_NAME.findall(_text([m for m in messages if m.type == "human"]))
+
+
+def _simulated_dispatch(messages: list[BaseMessage], digest: str) -> str:
+    # Dispatch strutturato: analisi e scelta degli strumenti in un'unica risposta JSON
+    actions = [{"tool": "find_file", "argument": name} for name in _mentioned_files(messages)[:1]]
+    return json.dumps({"summary": f"Segmento {digest[:8]}", "actions": actions})
+
+
+def _simulated_agent_step(messages: list[BaseMessage], digest: str) -> str:
+    mentioned = _mentioned_files(messages)
+    if mentioned and _text(messages).count("Observation:") < 2:
+        # Ciclo ReAct: prima un'azione sul file citato, poi la risposta finale
+        return f"Thought: cerco il file citato\nAction: find_file\nAction Input: {mentioned[0]}"
+    return f"Thought: nessuna azione necessaria\nFinal Answer: nessuna azione richiesta ({digest[:8]})"
+
+
+def _simulated_summary(messages: list[BaseMessage], digest: str) -> str:
+    return f"[sintesi simulata {digest[:8]}] {len(_text(messages))} caratteri elaborati."
+
+
+# Risposte simulate di una riunione, per tag della chiamata (vedi FakeChatModel)
+MEETING_RESPONSES = {
+    "transcription": _simulated_transcription,
+    "dispatch": _simulated_dispatch,
+    "agent": _simulated_agent_step,
+    "synthesis": _simulated_summary,
+    "summary_fold": _simulated_summary,
+    "summary_finalize": _simulated_summary,
+}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic offline stand-in for a chat model.
+
+    Every call site tags its requests (e.g. invoke(messages, config={"tags":
+    ["transcription"]})) and responses are registered explicitly per tag:
+    either a string or a function of (messages, request digest) returning
+    one. A request whose tags have no registered response raises LookupError.
+    Responses depend only on the request, so runs are repeatable.
+
+    Every call waits latency seconds plus up to jitter seconds, and fails
+    with probability error_rate; the failure draw depends on the request and
+    on how many times it was attempted, so retries can succeed.
+    """
+
+    model: str = "fake"
+    temperature: float = 0.0
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    # Tag -> risposta; condiviso con il FakeProvider, che può registrarne altre
+    responses: Any | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _prepare(self, messages: list[BaseMessage], stop=None):
+        digest = request_digest(self.model, self.temperature, messages, stop)
+        with _fake_lock:
+            attempt = _fake_attempts.get(digest, 0)
+            _fake_attempts[digest] = attempt + 1
+        delay = self.latency + self.jitter * _fraction(digest, "latency")
+        failed = self.error_rate > 0 and _fraction(digest, attempt) < self.error_rate
+        with _fake_lock:
+            _fake_stats["calls"] += 1
+            _fake_stats["latency_s"] += delay
+            _fake_stats["errors"] += int(failed)
+        return digest, delay, failed
+
+    def _respond(self, messages: list[BaseMessage], digest: str, failed: bool, run_manager) -> ChatResult:
+        tags = run_manager.tags if run_manager else []
+        responses = self.responses or {}
+        tag = next((tag for tag in tags if tag in responses), None)
+        if tag is None:
+            raise LookupError(f"No fake response registered for tags {tags}")
+        if failed:
+            raise RuntimeError(f"Simulated LLM provider error ({digest[:8]})")
+
+        content = responses[tag]
+        if callable(content):
+            content = content(messages, digest)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        digest, delay, failed = self._prepare(messages, stop)
+        time.sleep(delay)
+        return self._respond(messages, digest, failed, run_manager)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        digest, delay, failed = self._prepare(messages, stop)
+        await asyncio.sleep(delay)
+        return self._respond(messages, digest, failed, run_manager)
+
+    def get_num_tokens(self, text: str) -> int:
+        return max(1, len(text) // 4)
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """
+    Chat model that records responses to disk or replays them.
+
+    In "record" mode requests go to the wrapped model and each response is
+    stored as <directory>/<request digest>.json. In "replay" mode responses
+    are served from those files only, and a request that was never recorded
+    raises LookupError.
+    """
+
+    model: str = "unknown"
+    temperature: float = 0.0
+    mode: str = "replay"
+    directory: str = RECORD_DIR
+    inner: Any | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{self.mode}-{self.model}"
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _replay(self, digest: str) -> ChatResult:
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            raise LookupError(f"No recorded response for request {digest[:12]} in {self.directory}")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=record["response"]))])
+
+    def _record(self, digest: str, messages: list[BaseMessage], response) -> ChatResult:
+        record = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "messages": _describe_messages(messages),
+            "response": response.content,
+            "recorded": time.time(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(digest) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(digest))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response.content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        digest = request_digest(self.model, self.temperature, messages, stop)
+        if self.mode == "replay":
+            return self._replay(digest)
+        return self._record(digest, messages, self.inner.invoke(messages, stop=stop, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        digest = request_digest(self.model, self.temperature, messages, stop)
+        if self.mode == "replay":
+            return self._replay(digest)
+        response = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        return self._record(digest, messages, response)
+
+    def get_num_tokens(self, text: str) -> int:
+        if self.mode == "replay":
+            return max(1, len(text) // 4)
+        return self.inner.get_num_tokens(text)
+
+
+class LLMProvider(ABC):
+    """Creates chat models for the client registry (see llm_clients.get_llm)."""
+
+    name = "base"
+
+    @abstractmethod
+    def create(self, model: str, temperature: float) -> BaseChatModel:
+        """New chat model for model and temperature."""
+
+    def cache_namespace(self, model: str) -> str:
+        """Model name used in cache keys, so stand-in output never mixes with real results."""
+        return model
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def create(self, model, temperature):
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise ValueError(
+                "Google API key not found. Make sure the .env file contains the GEMINI_API_KEY variable."
+            )
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=model, google_api_key=gemini_api_key, temperature=temperature
+        )
+
+
+class FakeProvider(LLMProvider):
+    name = "fake"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        responses: dict[str, Any] | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.responses = dict(responses or {})
+
+    def register(self, tag: str, response):
+        """Answer requests tagged tag with response (a string or a function, see FakeChatModel)."""
+        self.responses[tag] = response
+
+    def create(self, model, temperature):
+        return FakeChatModel(
+            model=model,
+            temperature=temperature,
+            latency=self.latency,
+            jitter=self.jitter,
+            error_rate=self.error_rate,
+            responses=self.responses,
+        )
+
+    def cache_namespace(self, model):
+        return f"fake:{model}"
+
+
+class RecordReplayProvider(LLMProvider):
+    def __init__(self, mode: str, directory: str = RECORD_DIR, inner: LLMProvider | None = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown record/replay mode: {mode}")
+        self.name = mode
+        self.mode = mode
+        self.directory = directory
+        self.inner = inner or GeminiProvider()
+
+    def create(self, model, temperature):
+        return RecordReplayChatModel(
+            model=model,
+            temperature=temperature,
+            mode=self.mode,
+            directory=self.directory,
+            inner=self.inner.create(model, temperature) if self.mode == "record" else None,
+        )
+
+    def cache_namespace(self, model):
+        return self.inner.cache_namespace(model)
+
+
+def provider_from_env() -> LLMProvider:
+    """
+    Build the provider selected by LLM_PROVIDER (gemini, fake, record, replay).
+
+    The fake provider answers with MEETING_RESPONSES and reads
+    LLM_FAKE_LATENCY, LLM_FAKE_JITTER (seconds) and LLM_FAKE_ERROR_RATE;
+    record/replay store files in LLM_RECORD_DIR.
+    """
+    name = os.getenv("LLM_PROVIDER", "gemini").strip().lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "fake":
+        return FakeProvider(
+            latency=float(os.getenv("LLM_FAKE_LATENCY", "0")),
+            jitter=float(os.getenv("LLM_FAKE_JITTER", "0")),
+            error_rate=float(os.getenv("LLM_FAKE_ERROR_RATE", "0")),
+            responses=MEETING_RESPONSES,
+        )
+    if name in ("record", "replay"):
+        return RecordReplayProvider(name, os.getenv("LLM_RECORD_DIR", RECORD_DIR))
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
@@ -3,9 +3,7 @@ import sys
 import os
 import threading
 import time
-import json
 import platform
-import requests
 
 # Aggiungi il percorso della directory agents al path di Python
 sys.path.append(os.path.join(os.path.dirname(__file__), "agents"))
@@ -15,7 +13,10 @@ from synthesizer import synthesize_audio_folder
 from gui import NotificationDot  # Importa la classe NotificationDot
 from PySide6.QtWidgets import QApplication
 from call_reports.reports import create_report  # Importa la funzione create_report
+from call_reports.scheduler import get_report_scheduler  # Report preparati prima delle riunioni
 from agents.call_assistant_agent.agent import set_notification_callback  # Importa la funzione per impostare il callback
+from agents.call_assistant_agent.agent import get_prefilter  # Prefiltro e indice dei file
+from llm_clients import warm_up  # Client LLM condivisi
 
 # Variabile globale per tenere traccia del monitor audio
 audio_monitor = None
@@ -104,8 +105,10 @@ def toggle_audio_monitoring():
 
     if monitoring_active:
         print("Interruzione del monitoraggio audio...")
+        session_id = None
         if audio_monitor:
             audio_monitor.stop_monitoring()
+            session_id = audio_monitor.session_id
             audio_monitor = None
         monitoring_active = False
         
@@ -155,10 +158,13 @@ def toggle_audio_monitoring():
                     save_to_db=True,
                     topic=topic,
                     participants=participants,
+                    session_id=session_id,
                 )
             else:
                 # Just synthesize without saving to database
-                result = synthesize_audio_folder(output_file=output_file)
+                result = synthesize_audio_folder(
+                    output_file=output_file, session_id=session_id
+                )
 
             print("\nSINTESI DELLE REGISTRAZIONI:")
             print("=" * 70)
@@ -225,6 +231,20 @@ def check_videocall_apps() -> bool:
     return False
 
 
+def start_background_services():
+    """Avvia una sola volta i servizi in background dell'applicazione"""
+    # Prepara i report delle riunioni in calendario prima del loro inizio
+    get_report_scheduler().start()
+
+
+def generate_reports(notification_callback):
+    """Genera i report al momento, quando lo scheduler non ne ha uno pronto"""
+    try:
+        create_report(notification_callback=notification_callback)
+    except Exception as e:
+        print(f"Errore durante la generazione dei report: {e}")
+
+
 def manage_gui_state(videocall_running: bool):
     """Gestisce l'attivazione e la disattivazione della GUI in base allo stato delle videochiamate"""
     global notification_dot, gui_active, last_videocall_status, app
@@ -265,13 +285,18 @@ def manage_gui_state(videocall_running: bool):
             # Configuriamo la funzione di callback per le notifiche degli agenti
             set_notification_callback(notify_report)
             
-            # Chiamiamo il metodo create_report per generare report
+            # Mostriamo il report preparato in anticipo dallo scheduler,
             # ma solo una volta all'avvio della videochiamata
             if last_videocall_status == False:  # Solo quando passiamo da False a True
-                try:
-                    create_report(notification_callback=notify_report)
-                except Exception as e:
-                    print(f"Errore durante la generazione dei report: {e}")
+                report = get_report_scheduler().current_report()
+                if report:
+                    topic, content = report
+                    notify_report(f"📋 Report per: {topic}\n\n{content}")
+                else:
+                    # Nessun report pronto: lo generiamo senza bloccare il controllo delle chiamate
+                    threading.Thread(
+                        target=generate_reports, args=(notify_report,), daemon=True
+                    ).start()
                     
         elif not videocall_running and notification_dot is not None:
             # Disattiva la GUI
@@ -312,6 +337,15 @@ if __name__ == "__main__":
     if not QApplication.instance():
         app = QApplication(sys.argv)
     
+    # Apre in background le connessioni LLM, una sola volta all'avvio,
+    # così il primo segmento non paga l'handshake
+    warm_up()
+
+    # Costruisce in background l'indice dei file (e il vocabolario del prefiltro)
+    threading.Thread(target=get_prefilter, daemon=True).start()
+
+    start_background_services()
+
     # Verifica iniziale dello stato delle videochiamate
     apps = check_videocall_apps()
     print(f"Stato iniziale: {'Videochiamata in corso' if apps else 'Nessuna videochiamata in corso'}")
@@ -0,0 +1,501 @@
+import glob
+import json
+import mmap
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+WAV_HEADER_BYTES = 44
+
+
+def wav_header(data_bytes: int, sample_rate: int, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Header RIFF/WAVE PCM canonico di 44 byte"""
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_bytes,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        channels,
+        sample_rate,
+        byte_rate,
+        channels * sample_width,
+        sample_width * 8,
+        b"data",
+        data_bytes,
+    )
+
+
+def encode_wav(
+    audio_data: np.ndarray,
+    sample_rate: int,
+    channels: int = 1,
+    buffer: Optional[bytearray] = None,
+):
+    """Codifica campioni int16 come WAV in un unico buffer, con una sola copia dei dati.
+
+    Senza buffer restituisce un bytearray nuovo; con un buffer (vedi
+    WavBufferPool) scrive al suo inizio e restituisce una memoryview dei
+    soli byte del WAV, senza allocare.
+    """
+    pcm = np.ascontiguousarray(audio_data, dtype=np.int16)
+    size = WAV_HEADER_BYTES + pcm.nbytes
+    if buffer is None:
+        wav = buffer = bytearray(size)
+    elif len(buffer) < size:
+        raise ValueError(f"Buffer di {len(buffer)} byte insufficiente per un WAV di {size} byte")
+    else:
+        wav = memoryview(buffer)[:size]
+    wav[:WAV_HEADER_BYTES] = wav_header(pcm.nbytes, sample_rate, channels)
+    np.frombuffer(wav, dtype=np.int16, offset=WAV_HEADER_BYTES)[:] = pcm.reshape(-1)
+    return wav
+
+
+class WavBufferPool:
+    """Buffer riutilizzabili per la codifica WAV dei segmenti (vedi encode_wav).
+
+    acquire() restituisce un buffer libero, allocandone uno nuovo solo se
+    non ce ne sono o se il segmento non ci sta; i buffer nuovi hanno la
+    dimensione del segmento più lungo visto finora, così crescono solo
+    quando serve. release() rende il buffer di nuovo disponibile quando
+    nessuno ne usa più i byte. A regime i buffer sono tanti quanti i
+    segmenti in elaborazione o in attesa di scrittura.
+    """
+
+    def __init__(self, max_free: int = 4):
+        self.max_free = max_free
+        self.allocated = 0  # Buffer creati dall'inizio, per il monitoraggio
+        self._size = 0
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int):
+        """Alloca i buffer nuovi di almeno nbytes (es. il WAV di un segmento di durata massima)"""
+        with self._lock:
+            self._size = max(self._size, nbytes)
+
+    def acquire(self, nbytes: int) -> bytearray:
+        with self._lock:
+            self._size = max(self._size, nbytes)
+            buffer = self._free.pop() if self._free else None
+            if buffer is None or len(buffer) < nbytes:
+                # Un buffer troppo piccolo viene sostituito da uno della dimensione massima
+                buffer = bytearray(self._size)
+                self.allocated += 1
+            return buffer
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            if len(self._free) < self.max_free:
+                self._free.append(buffer)
+
+
+class WavSpoolWriter:
+    """Scrittura incrementale di un WAV int16 su file pre-dimensionato e mappato in memoria.
+
+    Ogni append copia i campioni nella mappatura e aggiorna subito le
+    dimensioni nell'header: se il processo termina in modo anomalo il file
+    resta un WAV valido con tutto l'audio ricevuto fino all'ultimo callback.
+    """
+
+    def __init__(self, path: str, sample_rate: int, channels: int = 1, capacity_samples: int = 0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.samples_written = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "w+b")
+        self._capacity = max(capacity_samples, 1)
+        self._file.truncate(WAV_HEADER_BYTES + self._capacity * 2)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[:WAV_HEADER_BYTES] = wav_header(0, sample_rate, channels)
+
+    def _grow(self, needed_samples: int):
+        # Raddoppia la capacità: caso raro, il file è dimensionato per un segmento massimo
+        self._capacity = max(needed_samples, self._capacity * 2)
+        self._map.close()
+        self._file.truncate(WAV_HEADER_BYTES + self._capacity * 2)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _patch_header(self):
+        data_bytes = self.samples_written * 2
+        self._map[4:8] = struct.pack("<I", 36 + data_bytes)
+        self._map[40:44] = struct.pack("<I", data_bytes)
+
+    def append(self, samples: np.ndarray):
+        """Accoda campioni int16 e aggiorna l'header"""
+        n = len(samples)
+        if n == 0:
+            return
+        end = self.samples_written + n
+        if end > self._capacity:
+            self._grow(end)
+        offset = WAV_HEADER_BYTES + self.samples_written * 2
+        self._map[offset : offset + n * 2] = np.ascontiguousarray(samples, dtype=np.int16).tobytes()
+        self.samples_written = end
+        self._patch_header()
+
+    def close(self, samples: Optional[int] = None) -> str:
+        """Chiude il file, tenendo al massimo `samples` campioni; restituisce il percorso"""
+        if samples is not None and samples < self.samples_written:
+            self.samples_written = max(0, samples)
+            self._patch_header()
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(WAV_HEADER_BYTES + self.samples_written * 2)
+        self._file.close()
+        return self.path
+
+    def discard(self):
+        """Chiude e cancella il file"""
+        self.close()
+        os.remove(self.path)
+
+
+def recover_spool(spool_dir: str) -> List[str]:
+    """Ripara i file lasciati nello spool da un'esecuzione interrotta.
+
+    L'header è aggiornato a ogni append, quindi basta troncare la parte
+    preallocata e mai scritta. Restituisce i percorsi dei file con audio.
+    """
+    recovered = []
+    if not os.path.isdir(spool_dir):
+        return recovered
+
+    for name in sorted(os.listdir(spool_dir)):
+        if not name.endswith(".wav"):
+            continue
+        path = os.path.join(spool_dir, name)
+        try:
+            with open(path, "r+b") as f:
+                header = f.read(WAV_HEADER_BYTES)
+                if len(header) < WAV_HEADER_BYTES or header[:4] != b"RIFF":
+                    raise ValueError("header WAV non valido")
+                data_bytes = struct.unpack("<I", header[40:44])[0]
+                f.truncate(WAV_HEADER_BYTES + data_bytes)
+        except (OSError, ValueError) as e:
+            print(f"Impossibile recuperare il file di spool {path}: {e}")
+            continue
+
+        if data_bytes == 0:
+            os.remove(path)
+        else:
+            recovered.append(path)
+    return recovered
+
+
+class SegmentStore:
+    """Archivio dei segmenti audio con ID sequenziali e manifest append-only.
+
+    Ogni segmento è salvato come audio_segment_<seq>.wav e descritto da righe
+    JSON nel manifest (una per la creazione e una per ogni cambio di stato).
+    I consumatori interrogano il manifest invece di rileggere la cartella.
+
+    I segmenti appartengono a una sessione di monitoraggio, registrata in un
+    secondo log; le sessioni concluse vengono spostate in archive/<session_id>.
+    """
+
+    MANIFEST_NAME = "manifest.jsonl"
+    SESSIONS_NAME = "sessions.jsonl"
+    ARCHIVE_DIR = "archive"
+
+    def __init__(self, directory: str = os.path.join("output", "audio")):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, self.MANIFEST_NAME)
+        self.sessions_path = os.path.join(directory, self.SESSIONS_NAME)
+        self._lock = threading.Lock()
+        self._entries: Dict[int, dict] = {}
+        self._sessions: Dict[str, dict] = {}
+        self._next_seq = 1
+        self._write_queue = queue.Queue()
+        self._writer = None
+        # Segmenti accodati da ciascun thread e callback in attesa della loro scrittura
+        self._queued = threading.local()
+        self._waiters: List[tuple] = []
+        # Buffer per encode_wav, da rilasciare quando il segmento è su disco
+        self.wav_buffers = WavBufferPool()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def _read_log(path: str) -> List[dict]:
+        records = []
+        if not os.path.exists(path):
+            return records
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Riga troncata da un'interruzione durante la scrittura
+                    continue
+        return records
+
+    def _load(self):
+        for record in self._read_log(self.manifest_path):
+            seq = record.get("seq")
+            if seq is None:
+                continue
+            self._entries.setdefault(seq, {}).update(record)
+            self._next_seq = max(self._next_seq, seq + 1)
+        for record in self._read_log(self.sessions_path):
+            session_id = record.get("session_id")
+            if session_id:
+                self._sessions.setdefault(session_id, {}).update(record)
+
+    @staticmethod
+    def _append_log(path: str, record: dict):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _append(self, record: dict):
+        self._append_log(self.manifest_path, record)
+
+    def start_session(self) -> str:
+        """Alloca un nuovo ID di sessione univoco e lo registra come attivo"""
+        base = time.strftime("%Y%m%d-%H%M%S")
+        with self._lock:
+            session_id, suffix = base, 1
+            while session_id in self._sessions:
+                suffix += 1
+                session_id = f"{base}-{suffix}"
+            record = {"session_id": session_id, "state": "active", "started": time.time()}
+            self._sessions[session_id] = dict(record)
+            self._append_log(self.sessions_path, record)
+        return session_id
+
+    def end_session(self, session_id: str):
+        """Segna la sessione come conclusa"""
+        record = {"session_id": session_id, "state": "closed", "ended": time.time()}
+        with self._lock:
+            self._sessions.setdefault(session_id, {}).update(record)
+            self._append_log(self.sessions_path, record)
+
+    def sessions(self) -> List[dict]:
+        """Sessioni registrate in ordine di avvio"""
+        with self._lock:
+            sessions = [dict(s) for s in self._sessions.values()]
+        return sorted(sessions, key=lambda s: s.get("started", 0))
+
+    def archive_sessions(self, keep: Optional[str] = None) -> int:
+        """Sposta in archive/ i segmenti di tutte le sessioni tranne `keep`.
+
+        Anche i WAV senza voce nel manifest (registrazioni precedenti) finiscono
+        in archive/legacy, così la cartella contiene solo la sessione corrente.
+        Restituisce il numero di file spostati.
+        """
+        moved = 0
+        with self._lock:
+            to_archive = [
+                e
+                for e in self._entries.values()
+                if "file" in e and e.get("state") != "archived" and e.get("session_id") != keep
+            ]
+            known = {os.path.basename(e["file"]) for e in self._entries.values() if "file" in e}
+
+        for entry in to_archive:
+            session_dir = os.path.join(self.ARCHIVE_DIR, entry.get("session_id") or "legacy")
+            target = os.path.join(session_dir, os.path.basename(entry["file"]))
+            try:
+                os.makedirs(os.path.join(self.directory, session_dir), exist_ok=True)
+                shutil.move(self.path(entry), os.path.join(self.directory, target))
+            except OSError as e:
+                print(f"Impossibile archiviare {entry['file']}: {e}")
+                continue
+            self.set_state(entry["seq"], "archived", file=target)
+            moved += 1
+
+        legacy_dir = os.path.join(self.directory, self.ARCHIVE_DIR, "legacy")
+        for path in glob.glob(os.path.join(self.directory, "*.wav")):
+            if os.path.basename(path) in known:
+                continue
+            os.makedirs(legacy_dir, exist_ok=True)
+            shutil.move(path, os.path.join(legacy_dir, os.path.basename(path)))
+            moved += 1
+
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                if session_id != keep and session.get("state") != "archived":
+                    record = {"session_id": session_id, "state": "archived"}
+                    session.update(record)
+                    self._append_log(self.sessions_path, record)
+
+        if moved:
+            print(f"Archiviati {moved} segmenti di sessioni precedenti")
+        return moved
+
+    def save(self, audio_data: np.ndarray, sample_rate: int, segment_info: Optional[dict] = None) -> dict:
+        """Scrive il segmento come WAV mono int16 e lo registra nel manifest"""
+        return self.save_wav_bytes(encode_wav(audio_data, sample_rate), sample_rate, segment_info, background=False)
+
+    def save_wav_bytes(
+        self,
+        wav_bytes,
+        sample_rate: int,
+        segment_info: Optional[dict] = None,
+        background: bool = True,
+    ) -> dict:
+        """Registra un segmento già codificato (vedi encode_wav) e ne scrive il file.
+
+        Con background=True la scrittura avviene nel thread di salvataggio e il
+        chiamante può usare subito gli stessi byte; il manifest segna
+        persisted=True quando il file è su disco. flush() attende le scritture.
+        """
+        segment_info = segment_info or {}
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+
+        samples = (len(wav_bytes) - WAV_HEADER_BYTES) // 2
+        entry = {
+            "seq": seq,
+            "file": f"audio_segment_{seq:06d}.wav",
+            "session_id": segment_info.get("session_id"),
+            "start_sample": segment_info.get("start_sample"),
+            "end_sample": segment_info.get("end_sample"),
+            "capture_rate": segment_info.get("capture_rate"),
+            "sample_rate": sample_rate,
+            "duration": round(samples / sample_rate, 3),
+            "state": "saved",
+            "persisted": False,
+            "updated": time.time(),
+        }
+        with self._lock:
+            self._entries[seq] = dict(entry)
+            self._append(entry)
+
+        if background:
+            with self._lock:
+                if not hasattr(self._queued, "seqs"):
+                    self._queued.seqs = []
+                self._queued.seqs.append(seq)
+            self._start_writer()
+            self._write_queue.put((seq, self.path(entry), wav_bytes))
+        else:
+            self._write(seq, self.path(entry), wav_bytes)
+        return entry
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            seq, path, wav_bytes = self._write_queue.get()
+            try:
+                self._write(seq, path, wav_bytes)
+            finally:
+                self._write_queue.task_done()
+
+    def _write(self, seq: int, path: str, wav_bytes):
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(wav_bytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Impossibile salvare il segmento {seq} in {path}: {e}")
+            record = {"seq": seq, "persisted": False, "error": str(e), "updated": time.time()}
+        else:
+            record = {"seq": seq, "persisted": True, "updated": time.time()}
+        # Nessun campo state: non sovrascrive uno stato già registrato (es. processed)
+        ready = []
+        with self._lock:
+            self._entries.setdefault(seq, {}).update(record)
+            self._append(record)
+            waiters = []
+            for pending, callback in self._waiters:
+                if seq in pending:
+                    if not record["persisted"]:
+                        # Scrittura fallita: il callback non viene chiamato
+                        continue
+                    pending.discard(seq)
+                if pending:
+                    waiters.append((pending, callback))
+                else:
+                    ready.append(callback)
+            self._waiters = waiters
+        for callback in ready:
+            callback()
+
+    def take_queued(self) -> List[int]:
+        """Segmenti accodati per la scrittura in background dal thread corrente dall'ultima chiamata"""
+        seqs = getattr(self._queued, "seqs", [])
+        self._queued.seqs = []
+        return seqs
+
+    def when_persisted(self, seqs, callback):
+        """Chiama callback quando tutti i segmenti seqs sono su disco.
+
+        Subito se lo sono già; mai se la scrittura di uno di essi fallisce.
+        Il callback può essere eseguito nel thread di salvataggio.
+        """
+        with self._lock:
+            pending = set()
+            for seq in seqs:
+                entry = self._entries.get(seq, {})
+                if entry.get("error") and not entry.get("persisted"):
+                    return
+                if not entry.get("persisted"):
+                    pending.add(seq)
+            if pending:
+                self._waiters.append((pending, callback))
+                return
+        callback()
+
+    def flush(self):
+        """Attende che tutti i segmenti accodati siano scritti su disco"""
+        self._write_queue.join()
+
+    def set_state(self, seq: int, state: str, **extra):
+        """Registra un cambio di stato del segmento (es. processed, failed)"""
+        record = {"seq": seq, "state": state, "updated": time.time(), **extra}
+        with self._lock:
+            self._entries.setdefault(seq, {}).update(record)
+            self._append(record)
+
+    def path(self, entry: dict) -> str:
+        return os.path.join(self.directory, entry["file"])
+
+    def entries(
+        self,
+        session_id: Optional[str] = None,
+        state: Optional[str] = None,
+        include_archived: bool = False,
+    ) -> List[dict]:
+        """Segmenti registrati in ordine di sequenza, filtrati per sessione e stato"""
+        with self._lock:
+            entries = [dict(e) for _, e in sorted(self._entries.items()) if "file" in e]
+        if session_id is not None:
+            entries = [e for e in entries if e.get("session_id") == session_id]
+        if state is not None:
+            entries = [e for e in entries if e.get("state") == state]
+        elif not include_archived:
+            entries = [e for e in entries if e.get("state") != "archived"]
+        return entries
+
+
+_segment_stores: Dict[str, SegmentStore] = {}
+_segment_stores_lock = threading.Lock()
+
+
+def get_segment_store(directory: str = os.path.join("output", "audio")) -> SegmentStore:
+    """SegmentStore condiviso per cartella, così i numeri di sequenza non collidono"""
+    key = os.path.abspath(directory)
+    with _segment_stores_lock:
+        store = _segment_stores.get(key)
+        if store is None:
+            store = _segment_stores[key] = SegmentStore(directory)
+        return store
@@ -1,74 +1,97 @@
-import os
+import asyncio
 import glob
-from pathlib import Path
-import base64
-from typing import List, Optional
+import os
+import threading
 import time
-import requests
-import json
 from datetime import datetime
 
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from call_reports.api_client import get_api_client
+from llm_clients import get_llm, run_async
+from spool import SegmentStore, get_segment_store
+from transcription import atranscribe_wav_file, transcribe_wav_file
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Get Google API key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError(
-        "Google API key not found. Make sure the .env file contains the GEMINI_API_KEY variable."
-    )
+# Map-reduce synthesis: token budget per LLM call, partial summaries merged
+# per reduce call, and maximum number of map/reduce rounds
+SYNTHESIS_MAX_CHUNK_TOKENS = 30000
+SYNTHESIS_FAN_IN = 4
+SYNTHESIS_MAX_DEPTH = 3
+CHARS_PER_TOKEN = 4  # Rough estimate, good enough for budgeting
 
-# API endpoint for saving call logs
-API_BASE_URL = "http://localhost:8000"
+TRANSCRIPT_SYNTHESIS_PROMPT = """
+        Sintetizza il contenuto delle trascrizioni seguenti in un riassunto ben strutturato.
+        Organizza il riassunto in sezioni logiche, evidenziando i punti chiave della conversazione.
+        Includi citazioni importanti e informazioni rilevanti.
+        """
 
+TRANSCRIPT_PARTIAL_PROMPT = """
+        Riassumi questa parte di una conversazione più lunga.
+        Conserva i punti chiave, le decisioni, le azioni da svolgere e le citazioni importanti,
+        nell'ordine in cui compaiono, così che il riassunto possa essere unito ad altri.
+        """
 
-def audio_to_base64(file_path: str) -> str:
-    """Convert an audio file to base64 encoding."""
-    with open(file_path, "rb") as audio_file:
-        return base64.b64encode(audio_file.read()).decode("utf-8")
+REPORT_SYNTHESIS_PROMPT = """
+            Synthesize the following material into a well-structured summary.
+            Organize the summary into logical sections, highlighting the main concepts.
+            Identify and connect related information across different contents.
+            Highlight points of uncertainty or contradictions, if present.
+            Include important quotes and relevant information.
+            """
+
+REPORT_PARTIAL_PROMPT = """
+            Summarize this part of a larger body of material.
+            Keep the main concepts, facts, figures, quotes and any contradictions,
+            so that the summary can later be merged with summaries of the other parts.
+            """
 
 
 def transcribe_audio_file(file_path: str) -> str:
-    """Transcribe a single audio file using Gemini."""
+    """Transcribe a single audio file using Gemini (cached by audio content)."""
     try:
-        # Convert the audio file to base64
-        base64_audio = audio_to_base64(file_path)
-
-        # Use Gemini for transcription
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",  # Using appropriate model for audio processing
-            google_api_key=GEMINI_API_KEY,
-            temperature=0,
-        )
+        return transcribe_wav_file(file_path)
+    except Exception as e:
+        print(f"Errore nella trascrizione del file {file_path}: {e}")
+        return f"[Impossibile trascrivere {os.path.basename(file_path)}: {e}]"
 
-        response = llm.invoke(
-            [
-                SystemMessage(
-                    content="Trascrivi dettagliatamente questo audio in italiano. Se c'è un discorso, cosa viene detto?"
-                ),
-                HumanMessage(
-                    content=[
-                        {
-                            "type": "media",
-                            "mime_type": "audio/wav",
-                            "data": base64_audio,
-                        }
-                    ]
-                ),
-            ]
-        )
 
-        return response.content
+async def transcribe_audio_file_async(file_path: str) -> str:
+    """Async variant of transcribe_audio_file; errors are returned as text."""
+    try:
+        return await atranscribe_wav_file(file_path)
     except Exception as e:
         print(f"Errore nella trascrizione del file {file_path}: {e}")
-        return f"[Impossibile trascrivere {os.path.basename(file_path)}: {str(e)}]"
+        return f"[Impossibile trascrivere {os.path.basename(file_path)}: {e}]"
+
+
+async def transcribe_audio_files(audio_files: list[str], concurrency: int = 4) -> list[str]:
+    """
+    Transcribe many audio files concurrently, at most `concurrency` at a time.
+
+    Results are returned in the same order as audio_files; a failing file
+    yields an error string without affecting the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    completed = 0
+
+    async def transcribe(audio_file: str) -> str:
+        nonlocal completed
+        async with semaphore:
+            transcription = await transcribe_audio_file_async(audio_file)
+        completed += 1
+        print(
+            f"Trascritto file {completed}/{len(audio_files)}: {os.path.basename(audio_file)}"
+        )
+        return transcription
 
+    return await asyncio.gather(*(transcribe(f) for f in audio_files))
 
-def save_synthesis_to_db(synthesis: str, topic: str, participants: List[str]) -> dict:
+
+def save_synthesis_to_db(synthesis: str, topic: str, participants: list[str]) -> dict:
     """
     Save the synthesis to the database using the API
 
@@ -92,12 +115,8 @@ def save_synthesis_to_db(synthesis: str, topic: str, participants: List[str]) ->
             "report": synthesis
         }
 
-        # Make the API call
-        response = requests.post(
-            f"{API_BASE_URL}/call-logs",
-            json=call_log_data,
-            headers={"Content-Type": "application/json"},
-        )
+        # Make the API call (pooled connection, with timeouts)
+        response = get_api_client().post("/call-logs", json=call_log_data)
 
         # Check if the request was successful
         if response.status_code == 201:
@@ -116,15 +135,332 @@ def save_synthesis_to_db(synthesis: str, topic: str, participants: List[str]) ->
         return {"error": str(e)}
 
 
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_text(text: str, max_tokens: int) -> list[str]:
+    """Split a text that exceeds the budget on paragraph boundaries (hard cut as a last resort)."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces, current, current_len = [], [], 0
+    for paragraph in text.split("\n\n"):
+        while len(paragraph) > max_chars:
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and current_len + len(paragraph) + 2 > max_chars:
+            pieces.append("\n\n".join(current))
+            current, current_len = [], 0
+        current.append(paragraph)
+        current_len += len(paragraph) + 2
+    if current:
+        pieces.append("\n\n".join(current))
+    return pieces
+
+
+def chunk_texts(texts: list[str], max_tokens: int, max_items: int | None = None) -> list[str]:
+    """
+    Pack consecutive texts into chunks that fit a token budget.
+
+    Args:
+        texts: Texts in their original order
+        max_tokens: Token budget of a single chunk
+        max_items: Maximum number of texts per chunk (optional)
+
+    Returns:
+        Chunks joined with blank lines, in order
+    """
+    chunks, current, current_tokens = [], [], 0
+    for text in texts:
+        for piece in _split_text(text, max_tokens) if estimate_tokens(text) > max_tokens else [text]:
+            tokens = estimate_tokens(piece)
+            if current and (
+                current_tokens + tokens > max_tokens
+                or (max_items is not None and len(current) >= max_items)
+            ):
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def map_reduce_summarize(
+    texts: list[str],
+    final_prompt: str,
+    partial_prompt: str,
+    max_chunk_tokens: int = SYNTHESIS_MAX_CHUNK_TOKENS,
+    fan_in: int = SYNTHESIS_FAN_IN,
+    max_depth: int = SYNTHESIS_MAX_DEPTH,
+    concurrency: int = 4,
+    temperature: float = 0.2,
+) -> str:
+    """
+    Summarize arbitrarily long material with a hierarchical map-reduce.
+
+    Texts are packed into chunks within max_chunk_tokens and summarized in
+    parallel (map); the partial summaries are then merged fan_in at a time
+    (reduce) until a single chunk remains, which gets the final prompt.
+    Material that fits one chunk takes a single call, as before. Latency
+    grows with the tree depth rather than with the input length.
+    """
+    llm = get_llm("gemini-1.5-pro", temperature)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def summarize(text: str, prompt: str) -> str:
+        async with semaphore:
+            response = await llm.ainvoke(
+                [SystemMessage(content=prompt), HumanMessage(content=text)],
+                config={"tags": ["synthesis"]},
+            )
+        return response.content
+
+    chunks = chunk_texts(texts, max_chunk_tokens)
+    depth = 0
+    # Si riduce finché il materiale non entra in una sola chiamata finale
+    while (
+        len(chunks) > 1
+        and estimate_tokens("\n\n".join(chunks)) > max_chunk_tokens
+        and depth < max_depth
+    ):
+        print(f"Sintesi map-reduce: livello {depth + 1}, {len(chunks)} blocchi")
+        partials = await asyncio.gather(*(summarize(c, partial_prompt) for c in chunks))
+        chunks = chunk_texts(partials, max_chunk_tokens, max_items=max(2, fan_in))
+        depth += 1
+
+    # Al limite di profondità i blocchi rimasti vengono uniti nella chiamata finale
+    return await summarize("\n\n".join(chunks), final_prompt)
+
+
+class RollingSummarizer:
+    """
+    Maintain a structured summary of a call while it is still going on.
+
+    Each segment transcription is folded into the running summary on a
+    background thread as soon as it arrives (several pending transcriptions
+    are folded in one call when the worker falls behind), so at the end of
+    the call only a short finalization step over the summary is needed.
+    """
+
+    FOLD_PROMPT = """
+        Aggiorna il riassunto strutturato di una chiamata in corso integrando le nuove trascrizioni.
+        Mantieni le sezioni: Argomenti discussi, Decisioni, Azioni da svolgere, Citazioni importanti.
+        Conserva le informazioni già presenti, unisci i duplicati e restituisci solo il riassunto aggiornato.
+        """
+
+    FINALIZE_PROMPT = """
+        Rifinisci il riassunto seguente in una sintesi finale ben strutturata della chiamata.
+        Organizza il contenuto in sezioni logiche, evidenziando i punti chiave della conversazione.
+        Includi citazioni importanti e informazioni rilevanti.
+        """
+
+    def __init__(self, session_id: str, model: str = "gemini-1.5-pro", temperature: float = 0.2):
+        self.session_id = session_id
+        self.summary = ""
+        self.folded_seqs = set()
+        self.fold_calls = 0
+        self._llm = get_llm(model, temperature)
+        self._pending: dict[int, str] = {}
+        self._in_flight = set()  # Segmenti del fold in corso
+        self._condition = threading.Condition()
+        self._busy = False
+        self._stopped = False
+        self._failed = False  # Ultimo aggiornamento fallito: si riprova alla prossima add
+        self._worker = threading.Thread(target=self._worker_loop, daemon=True)
+        self._worker.start()
+
+    def add(self, seq: int, transcription: str):
+        """Queue a segment transcription to be folded into the summary."""
+        with self._condition:
+            if seq in self.folded_seqs:
+                return
+            self._pending[seq] = transcription
+            self._failed = False
+            self._condition.notify_all()
+
+    def known_seqs(self) -> set:
+        """Segments already folded, being folded or waiting to be folded."""
+        with self._condition:
+            return self.folded_seqs | self._in_flight | set(self._pending)
+
+    def _fold(self, batch: list[tuple[int, str]]):
+        new_text = "".join(
+            f"Segmento {seq}:\n{transcription}\n\n" for seq, transcription in batch
+        )
+        current = self.summary or "(nessun contenuto finora)"
+        response = self._llm.invoke(
+            [
+                SystemMessage(content=self.FOLD_PROMPT),
+                HumanMessage(
+                    content=f"Riassunto attuale:\n{current}\n\nNuove trascrizioni:\n{new_text}"
+                ),
+            ],
+            config={"tags": ["summary_fold"]},
+        )
+        self.summary = response.content
+        self.fold_calls += 1
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while (not self._pending or self._failed) and not self._stopped:
+                    self._busy = False
+                    self._condition.notify_all()
+                    self._condition.wait()
+                if self._stopped:
+                    self._busy = False
+                    self._condition.notify_all()
+                    return
+                self._busy = True
+                batch = sorted(self._pending.items())
+                self._pending.clear()
+                self._in_flight = {seq for seq, _ in batch}
+
+            try:
+                self._fold(batch)
+                with self._condition:
+                    self.folded_seqs.update(self._in_flight)
+                    self._in_flight = set()
+            except Exception as e:
+                print(f"Errore nell'aggiornamento del riassunto incrementale: {e}")
+                with self._condition:
+                    # Verranno ritentate insieme alla prossima trascrizione
+                    for seq, transcription in batch:
+                        self._pending.setdefault(seq, transcription)
+                    self._in_flight = set()
+                    self._failed = True
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until every queued transcription has been folded."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._busy and (not self._pending or self._failed),
+                timeout=timeout,
+            )
+
+    def close(self, timeout: float | None = None):
+        """Stop the worker thread; a fold already running is completed first."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._worker is not threading.current_thread():
+            self._worker.join(timeout)
+
+    def finalize(self, missing: list[tuple[int, str]] | None = None, timeout: float = 120) -> str:
+        """
+        Fold any remaining transcriptions and produce the final synthesis.
+
+        The worker thread is stopped afterwards, whether or not it succeeds.
+
+        Args:
+            missing: (seq, transcription) pairs for segments the live path never delivered
+            timeout: Seconds to wait for pending folds before giving up
+
+        Returns:
+            The final synthesis text
+        """
+        try:
+            for seq, transcription in missing or []:
+                self.add(seq, transcription)
+            with self._condition:
+                # Un ultimo tentativo per eventuali aggiornamenti falliti
+                self._failed = False
+                self._condition.notify_all()
+            if not self.wait_idle(timeout):
+                raise TimeoutError("Il riassunto incrementale non è stato completato in tempo.")
+            with self._condition:
+                if self._pending:
+                    raise RuntimeError("Alcune trascrizioni non sono state integrate nel riassunto.")
+        finally:
+            self.close(timeout=5)
+        if not self.summary:
+            raise ValueError("Il riassunto incrementale è vuoto.")
+
+        response = self._llm.invoke(
+            [
+                SystemMessage(content=self.FINALIZE_PROMPT),
+                HumanMessage(content=self.summary),
+            ],
+            config={"tags": ["summary_finalize"]},
+        )
+        return response.content
+
+
+_rolling_summarizers: dict[str, RollingSummarizer] = {}
+_rolling_summarizers_lock = threading.Lock()
+
+
+def get_rolling_summarizer(session_id: str) -> RollingSummarizer:
+    """Return the rolling summarizer of a monitoring session, creating it if needed."""
+    with _rolling_summarizers_lock:
+        summarizer = _rolling_summarizers.get(session_id)
+        if summarizer is None:
+            summarizer = _rolling_summarizers[session_id] = RollingSummarizer(session_id)
+        return summarizer
+
+
+def pop_rolling_summarizer(session_id: str) -> RollingSummarizer | None:
+    """Detach the rolling summarizer of a session, if the live path created one."""
+    with _rolling_summarizers_lock:
+        return _rolling_summarizers.pop(session_id, None)
+
+
+async def finalize_rolling_summary(
+    summarizer: RollingSummarizer, entries: list[dict], store: SegmentStore, concurrency: int = 4
+) -> str:
+    """Fold the segments the live path missed, then finalize the rolling summary."""
+    known = summarizer.known_seqs()
+    missing_entries = [e for e in entries if e["seq"] not in known]
+    missing = []
+    if missing_entries:
+        print(f"{len(missing_entries)} segmenti non ancora nel riassunto incrementale.")
+        results = await transcribe_audio_files(
+            [store.path(e) for e in missing_entries], concurrency
+        )
+        missing = [(e["seq"], text) for e, text in zip(missing_entries, results)]
+    return await asyncio.to_thread(summarizer.finalize, missing)
+
+
 def synthesize_audio_folder(
     folder_path: str = "output/audio",
-    output_file: Optional[str] = None,
+    output_file: str | None = None,
+    save_to_db: bool = False,
+    topic: str | None = None,
+    participants: list[str] | None = None,
+    session_id: str | None = None,
+    concurrency: int = 4,
+) -> str:
+    """
+    Versione sincrona di synthesize_audio_folder_async (stessi argomenti).
+    Viene eseguita sul loop condiviso dei client LLM (vedi run_async), così i
+    client asincroni restano gli stessi tra una sintesi e l'altra.
+    """
+    return run_async(
+        synthesize_audio_folder_async(
+            folder_path=folder_path,
+            output_file=output_file,
+            save_to_db=save_to_db,
+            topic=topic,
+            participants=participants,
+            session_id=session_id,
+            concurrency=concurrency,
+        )
+    )
+
+
+async def synthesize_audio_folder_async(
+    folder_path: str = "output/audio",
+    output_file: str | None = None,
     save_to_db: bool = False,
-    topic: Optional[str] = None,
-    participants: Optional[List[str]] = None,
+    topic: str | None = None,
+    participants: list[str] | None = None,
+    session_id: str | None = None,
+    concurrency: int = 4,
 ) -> str:
     """
-    Prende tutti i file audio nella cartella specificata, li trascrive e
+    Prende i file audio nella cartella specificata, li trascrive in parallelo e
     sintetizza il contenuto utilizzando Gemini.
 
     Args:
@@ -133,63 +469,94 @@ def synthesize_audio_folder(
         save_to_db: Indica se salvare la sintesi nel database (default: False)
         topic: Argomento della chiamata (necessario se save_to_db è True)
         participants: Lista dei partecipanti alla chiamata (necessario se save_to_db è True)
+        session_id: Sessione di monitoraggio da sintetizzare; se assente si usano
+            i segmenti non archiviati della cartella
+        concurrency: Numero massimo di trascrizioni contemporanee (default: 4)
 
     Returns:
         Il testo sintetizzato
     """
     # Verifica che la cartella esista
-    if not os.path.exists(folder_path):
+    if not await asyncio.to_thread(os.path.exists, folder_path):
         return f"Errore: La cartella {folder_path} non esiste."
 
-    # Trova tutti i file WAV nella cartella
-    audio_files = sorted(glob.glob(os.path.join(folder_path, "*.wav")))
+    # Lettura del manifest o della cartella fuori dall'event loop
+    store, entries, audio_files = await asyncio.to_thread(_find_segments, folder_path, session_id)
 
+    summarizer = pop_rolling_summarizer(session_id) if session_id else None
     if not audio_files:
+        if summarizer is not None:
+            summarizer.close()
+        if session_id:
+            return f"Nessun file audio trovato per la sessione {session_id}."
         return f"Nessun file audio trovato nella cartella {folder_path}."
 
+    # Se il riassunto è stato mantenuto durante la chiamata resta solo la finalizzazione
+    if summarizer is not None:
+        try:
+            print("Finalizzazione del riassunto incrementale...")
+            synthesis = await finalize_rolling_summary(
+                summarizer, entries, store, concurrency
+            )
+        except Exception as e:
+            summarizer.close()
+            print(f"Riassunto incrementale non disponibile ({e}), sintesi completa...")
+        else:
+            return await asyncio.to_thread(
+                _store_synthesis, synthesis, output_file, save_to_db, topic, participants
+            )
+
     print(f"Trovati {len(audio_files)} file audio. Inizio trascrizione...")
 
-    # Trascrivi ogni file audio
-    transcriptions = []
-    for i, audio_file in enumerate(audio_files):
-        print(
-            f"Trascrivendo file {i + 1}/{len(audio_files)}: {os.path.basename(audio_file)}"
-        )
-        transcription = transcribe_audio_file(audio_file)
-        transcriptions.append(
-            {"file": os.path.basename(audio_file), "transcription": transcription}
-        )
+    # Trascrivi i file in parallelo mantenendo l'ordine dei segmenti
+    results = await transcribe_audio_files(audio_files, concurrency)
+    transcriptions = [
+        {"file": os.path.basename(audio_file), "transcription": transcription}
+        for audio_file, transcription in zip(audio_files, results)
+    ]
 
-    # Prepara il testo combinato da tutte le trascrizioni
-    combined_text = ""
-    for item in transcriptions:
-        combined_text += f"File: {item['file']}\n"
-        combined_text += f"Trascrizione: {item['transcription']}\n\n"
+    # Un testo per trascrizione, nell'ordine dei segmenti
+    texts = [
+        f"File: {item['file']}\nTrascrizione: {item['transcription']}"
+        for item in transcriptions
+    ]
 
     print("Trascrizioni completate. Sintetizzando il contenuto...")
 
-    # Usa Gemini per sintetizzare il contenuto delle trascrizioni
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-1.5-pro",
-        google_api_key=GEMINI_API_KEY,
+    # Usa Gemini per sintetizzare le trascrizioni (map-reduce se non entrano in una chiamata)
+    synthesis = await map_reduce_summarize(
+        texts,
+        TRANSCRIPT_SYNTHESIS_PROMPT,
+        TRANSCRIPT_PARTIAL_PROMPT,
+        concurrency=concurrency,
         temperature=0.2,  # Leggera creatività per una sintesi migliore
     )
-
-    response = llm.invoke(
-        [
-            SystemMessage(
-                content="""
-        Sintetizza il contenuto delle trascrizioni seguenti in un riassunto ben strutturato.
-        Organizza il riassunto in sezioni logiche, evidenziando i punti chiave della conversazione.
-        Includi citazioni importanti e informazioni rilevanti.
-        """
-            ),
-            HumanMessage(content=combined_text),
-        ]
+    return await asyncio.to_thread(
+        _store_synthesis, synthesis, output_file, save_to_db, topic, participants
     )
 
-    synthesis = response.content
 
+def _find_segments(
+    folder_path: str, session_id: str | None
+) -> tuple[SegmentStore | None, list[dict], list[str]]:
+    """(store, voci del manifest, file audio) dei segmenti da sintetizzare"""
+    # Usa il manifest dei segmenti se presente, altrimenti elenca la cartella
+    # (registrazioni precedenti all'introduzione del manifest)
+    if session_id or os.path.exists(os.path.join(folder_path, SegmentStore.MANIFEST_NAME)):
+        store = get_segment_store(folder_path)
+        entries = store.entries(session_id=session_id, include_archived=bool(session_id))
+        return store, entries, [store.path(entry) for entry in entries]
+    return None, [], sorted(glob.glob(os.path.join(folder_path, "*.wav")))
+
+
+def _store_synthesis(
+    synthesis: str,
+    output_file: str | None,
+    save_to_db: bool,
+    topic: str | None,
+    participants: list[str] | None,
+) -> str:
+    """Salva la sintesi su file e/o nel database secondo le opzioni richieste"""
     # Salva su file se richiesto
     if output_file:
         output_dir = os.path.dirname(output_file)
@@ -211,62 +578,53 @@ def synthesize_audio_folder(
     return synthesis
 
 
-def synthesize_report_content(file_contents: List[str], call_reports: List[str]) -> str:
+def synthesize_report_content(
+    file_contents: list[str], call_reports: list[str], concurrency: int = 4
+) -> str:
     """
     Synthesize the content of files and call reports using LLM.
-    
+
+    Material larger than a single call's token budget is summarized with a
+    hierarchical map-reduce (see map_reduce_summarize).
+
     Args:
         file_contents: List of strings containing the text of the files
         call_reports: List of strings containing the call reports
-        
+        concurrency: Maximum number of concurrent LLM calls
+
     Returns:
         A string containing the synthesis of the content
     """
     print("Synthesizing the content of files and reports...")
-    
-    combined_text = ""
-    
+
+    texts = []
     if file_contents:
-        combined_text += "# FILE CONTENTS\n\n"
-        for i, content in enumerate(file_contents):
-            combined_text += f"--- File {i+1} ---\n"
-            combined_text += f"{content}\n\n"
-    
+        texts.append("# FILE CONTENTS")
+        texts.extend(
+            f"--- File {i + 1} ---\n{content}" for i, content in enumerate(file_contents)
+        )
     if call_reports:
-        combined_text += "# CALL REPORTS\n\n"
-        for i, report in enumerate(call_reports):
-            combined_text += f"--- Report {i+1} ---\n"
-            combined_text += f"{report}\n\n"
-    
-    if not combined_text:
+        texts.append("# CALL REPORTS")
+        texts.extend(
+            f"--- Report {i + 1} ---\n{report}" for i, report in enumerate(call_reports)
+        )
+
+    if not texts:
         return "No content to synthesize."
-    
+
     try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            google_api_key=GEMINI_API_KEY,
-            temperature=0.2,  # Slight creativity for a better synthesis
-        )
-        
-        response = llm.invoke(
-            [
-                SystemMessage(
-                    content="""
-            Synthesize the following material into a well-structured summary.
-            Organize the summary into logical sections, highlighting the main concepts.
-            Identify and connect related information across different contents.
-            Highlight points of uncertainty or contradictions, if present.
-            Include important quotes and relevant information.
-            """
-                ),
-                HumanMessage(content=combined_text),
-            ]
+        return run_async(
+            map_reduce_summarize(
+                texts,
+                REPORT_SYNTHESIS_PROMPT,
+                REPORT_PARTIAL_PROMPT,
+                concurrency=concurrency,
+                temperature=0.2,  # Slight creativity for a better synthesis
+            )
         )
-        
-        return response.content
     except Exception as e:
         print(f"Error during content synthesis: {e}")
-        return f"Synthesis error: {str(e)}"
+        return f"Synthesis error: {e}"
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import audio
+from agents.call_assistant_agent import agent
+from audio import SegmentWorkerPool
+from spool import SegmentStore
+
+
+def _stalled_pool(max_merge_samples):
+    """Pool con un solo worker bloccato sul primo segmento finché release non è impostato"""
+    release = threading.Event()
+    pool = SegmentWorkerPool(
+        lambda audio_data, *args: release.wait(),
+        num_workers=1,
+        max_queue_size=1,
+        overflow_policy="merge",
+        max_merge_samples=max_merge_samples,
+    )
+    pool.submit(np.zeros(100, dtype=np.int16))
+    deadline = time.monotonic() + 5
+    while pool.stats()["active"] == 0:
+        assert time.monotonic() < deadline, "il worker non è partito"
+        time.sleep(0.01)
+    return pool, release
+
+
+def test_merge_stays_under_cap_with_stalled_worker():
+    cap = 1000
+    pool, release = _stalled_pool(cap)
+    try:
+        for _ in range(50):
+            assert pool.submit(np.ones(300, dtype=np.int16))
+            assert all(len(audio_data) <= cap for audio_data, _ in pool._queue)
+        stats = pool.stats()
+        assert stats["queue_depth"] == 1
+        assert stats["merged"] > 0
+        # Oltre il limite si ripiega su drop_oldest
+        assert stats["rejected"] > 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_merge_joins_adjacent_segments_under_cap():
+    pool, release = _stalled_pool(1000)
+    try:
+        pool.submit(np.full(300, 1, dtype=np.int16))
+        pool.submit(np.full(300, 2, dtype=np.int16))
+        (audio_data, _), = pool._queue
+        assert audio_data.tolist() == [1] * 300 + [2] * 300
+        assert pool.stats()["rejected"] == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_process_marks_segment_failed_when_transcription_fails(tmp_path, monkeypatch):
+    store = SegmentStore(str(tmp_path))
+    monkeypatch.setattr(audio, "get_segment_store", lambda: store)
+
+    def transcribe_wav_bytes(wav_bytes):
+        raise RuntimeError("servizio di trascrizione non disponibile")
+
+    monkeypatch.setattr(agent, "transcribe_wav_bytes", transcribe_wav_bytes)
+
+    with pytest.raises(RuntimeError):
+        audio.process(np.zeros(1600, dtype=np.int16), 16000)
+    store.flush()
+
+    (entry,) = store.entries()
+    assert entry["state"] == "failed"
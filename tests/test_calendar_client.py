@@ -0,0 +1,50 @@
+from datetime import UTC, datetime, timedelta
+
+from call_reports.calendar_client import FULL_SYNC_HORIZON, CalendarClient
+
+
+class RecordingClient(CalendarClient):
+    """Client che registra le richieste invece di chiamare l'API"""
+
+    def __init__(self):
+        super().__init__(store_path=None, credentials=object())
+        self.requests = []
+
+    def _list_pages(self, **params):
+        self.requests.append(params)
+        return [], f"token-{len(self.requests)}"
+
+
+def _time_max(params):
+    return datetime.fromisoformat(params["timeMax"])
+
+
+def test_full_sync_is_bounded_and_followed_by_incremental_syncs():
+    client = RecordingClient()
+    client.sync()
+    (params,) = client.requests
+    assert set(params) == {"timeMin", "timeMax"}
+    expected_end = datetime.now(tz=UTC) + FULL_SYNC_HORIZON
+    assert abs(_time_max(params) - expected_end) < timedelta(minutes=1)
+
+    client.sync()
+    assert len(client.requests) == 1
+    client.sync(force=True)
+    assert client.requests[-1] == {"syncToken": "token-1"}
+
+
+def test_full_sync_renews_the_window_before_it_runs_out():
+    client = RecordingClient()
+    client.sync()
+    client._window_end = datetime.now(tz=UTC) + FULL_SYNC_HORIZON / 3
+    client.sync(force=True)
+    assert "timeMax" in client.requests[-1]
+    assert client.stats()["full_syncs"] == 2
+
+
+def test_query_beyond_the_window_extends_it():
+    client = RecordingClient()
+    client.upcoming(hours=24)
+    client.upcoming(hours=24 * 60)
+    assert len(client.requests) == 2
+    assert _time_max(client.requests[-1]) - datetime.now(tz=UTC) > timedelta(days=59)
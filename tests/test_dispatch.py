@@ -0,0 +1,23 @@
+import pytest
+
+from agents.call_assistant_agent.dispatch import parse_decision
+
+
+def test_parse_decision_ignores_text_after_the_object():
+    text = (
+        '```json\n{"summary": "Budget {draft}", "actions": '
+        '[{"tool": "find_file", "argument": "budget.xlsx"}]}\n```\n'
+        "Note: {not part of the answer}"
+    )
+    decision = parse_decision(text)
+    assert decision.summary == "Budget {draft}"
+    assert [(a.tool, a.argument) for a in decision.actions] == [("find_file", "budget.xlsx")]
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["no JSON here", '{"summary": "x", "actions": [{"tool": "delete_file"}]}', '{"summary": '],
+)
+def test_parse_decision_rejects_invalid_answers(text):
+    with pytest.raises(ValueError):
+        parse_decision(text)
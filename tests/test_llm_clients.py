@@ -0,0 +1,41 @@
+import pytest
+
+import llm_clients
+from llm_clients import client_stats, get_llm, run_async, set_provider, warm_up
+from llm_providers import FakeProvider
+
+
+@pytest.fixture
+def fake_provider():
+    previous = llm_clients._provider
+    set_provider(FakeProvider())
+    yield
+    set_provider(previous)
+
+
+async def _client(temperature):
+    return get_llm(temperature=temperature)
+
+
+def test_async_clients_outlive_each_call(fake_provider):
+    warm_up(background=False)
+    first = run_async(_client(0.2))
+    second = run_async(_client(0.2))
+
+    assert first is second
+    assert first is not get_llm(temperature=0.2)
+    # One sync client and one for the shared loop, both built by the warm-up
+    assert client_stats()[f"{llm_clients.DEFAULT_MODEL}@0.2"]["constructed"] == 2
+
+
+def test_fake_model_answers_with_the_response_registered_for_the_tag():
+    provider = FakeProvider(responses={"synthesis": "riassunto"})
+    provider.register("dispatch", lambda messages, digest: f"{len(messages)} messaggi")
+    llm = provider.create("fake", 0)
+
+    assert llm.invoke("testo", config={"tags": ["synthesis"]}).content == "riassunto"
+    assert llm.invoke("testo", config={"tags": ["dispatch"]}).content == "1 messaggi"
+    with pytest.raises(LookupError):
+        llm.invoke("testo", config={"tags": ["transcription"]})
+    with pytest.raises(LookupError):
+        llm.invoke("testo")
@@ -0,0 +1,34 @@
+import io
+import wave
+
+import numpy as np
+
+from spool import WavBufferPool, encode_wav
+
+
+def test_encode_wav_into_buffer_matches_new_allocation():
+    audio_data = np.arange(-500, 500, dtype=np.int16)
+    buffer = bytearray(4096)
+
+    wav_bytes = encode_wav(audio_data, 16000, buffer=buffer)
+
+    assert bytes(wav_bytes) == bytes(encode_wav(audio_data, 16000))
+    with wave.open(io.BytesIO(bytes(wav_bytes))) as wf:
+        assert wf.getframerate() == 16000
+        assert np.array_equal(np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16), audio_data)
+
+
+def test_buffer_pool_reuses_released_buffers():
+    pool = WavBufferPool()
+    for _ in range(10):
+        buffer = pool.acquire(2000)
+        encode_wav(np.zeros(900, dtype=np.int16), 16000, buffer=buffer)
+        pool.release(buffer)
+    assert pool.allocated == 1
+
+    # Un segmento più lungo sostituisce il buffer con uno più grande
+    buffer = pool.acquire(8000)
+    assert len(buffer) == 8000
+    assert pool.allocated == 2
+    pool.release(buffer)
+    assert pool.acquire(2000) is buffer
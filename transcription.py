@@ -0,0 +1,222 @@
+import asyncio
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from llm_clients import get_llm, get_provider
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Model and prompt shared by the live agent path and end-of-call synthesis,
+# so both hit the same cache entries
+TRANSCRIPTION_MODEL = "gemini-1.5-pro"
+TRANSCRIPTION_PROMPT = (
+    "Trascrivi dettagliatamente cosa viene detto in questo audio, nella lingua "
+    "in cui si parla. Se vengono menzionati nomi di file o documenti, "
+    "trascrivili con precisione."
+)
+
+CACHE_PATH = os.path.join("output", "cache", "transcriptions.sqlite3")
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+
+def cache_key(audio_bytes: bytes, model: str, prompt: str) -> str:
+    """Content hash of the audio plus everything that affects the transcription."""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(audio_bytes)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Persistent transcription cache stored in SQLite.
+
+    Entries are keyed by cache_key() and evicted least-recently-used first
+    once the stored transcriptions exceed max_bytes.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transcriptions (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                transcription TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transcriptions_last_used ON transcriptions (last_used)"
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM transcriptions"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcription FROM transcriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE transcriptions SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, transcription: str):
+        size = len(transcription.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM transcriptions WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcriptions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, transcription, size, now, now),
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM transcriptions ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                self._total_bytes = 0
+                return
+            self._conn.execute("DELETE FROM transcriptions WHERE key = ?", (row[0],))
+            self._total_bytes -= row[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM transcriptions").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_transcription_cache() -> TranscriptionCache:
+    """Process-wide transcription cache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscriptionCache()
+        return _cache
+
+
+def _transcription_llm(model: str):
+    return get_llm(model, temperature=0)
+
+
+def _transcription_messages(audio_bytes: bytes, prompt: str):
+    return [
+        SystemMessage(content=prompt),
+        HumanMessage(
+            content=[
+                {
+                    "type": "media",
+                    "mime_type": "audio/wav",
+                    "data": base64.b64encode(audio_bytes).decode("utf-8"),
+                }
+            ]
+        ),
+    ]
+
+
+def transcribe_wav_bytes(
+    audio_bytes: bytes,
+    model: str = TRANSCRIPTION_MODEL,
+    prompt: str = TRANSCRIPTION_PROMPT,
+) -> str:
+    """
+    Transcribe WAV audio with Gemini, reusing a cached result for identical audio.
+
+    Raises on API errors so callers decide how to report them; failures are
+    never cached.
+    """
+    cache = get_transcription_cache()
+    key = cache_key(audio_bytes, get_provider().cache_namespace(model), prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = _transcription_llm(model).invoke(
+        _transcription_messages(audio_bytes, prompt), config={"tags": ["transcription"]}
+    )
+
+    transcription = response.content
+    cache.put(key, model, transcription)
+    return transcription
+
+
+async def atranscribe_wav_bytes(
+    audio_bytes: bytes,
+    model: str = TRANSCRIPTION_MODEL,
+    prompt: str = TRANSCRIPTION_PROMPT,
+) -> str:
+    """Async variant of transcribe_wav_bytes using ainvoke."""
+    cache = get_transcription_cache()
+    key = cache_key(audio_bytes, get_provider().cache_namespace(model), prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = await _transcription_llm(model).ainvoke(
+        _transcription_messages(audio_bytes, prompt), config={"tags": ["transcription"]}
+    )
+
+    transcription = response.content
+    cache.put(key, model, transcription)
+    return transcription
+
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+
+def transcribe_wav_file(file_path: str, **kwargs) -> str:
+    """Transcribe a WAV file on disk; see transcribe_wav_bytes."""
+    return transcribe_wav_bytes(_read_file(file_path), **kwargs)
+
+
+async def atranscribe_wav_file(file_path: str, **kwargs) -> str:
+    """Async variant of transcribe_wav_file; the file is read in a worker thread."""
+    audio_bytes = await asyncio.to_thread(_read_file, file_path)
+    return await atranscribe_wav_bytes(audio_bytes, **kwargs)
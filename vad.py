@@ -0,0 +1,120 @@
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Rilevatore di attività vocale basato su feature a livello di frame.
+
+    Per ogni frame calcola in un solo passaggio vettorizzato energia (RMS),
+    zero-crossing rate e spectral flatness. Un frame è considerato parlato se
+    l'energia supera il rumore di fondo stimato in modo adattivo e lo spettro
+    non è piatto come quello del rumore. La decisione viene mantenuta per
+    qualche frame dopo la fine del parlato (hangover) per non spezzare le frasi.
+
+    Può essere usato in streaming con is_speech() oppure offline su interi
+    array con analyze() e speech_segments().
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 44100,
+        frame_size: int = 1024,
+        energy_floor: float = 500.0,  # RMS minimo assoluto (int16)
+        energy_ratio: float = 3.0,  # Margine sopra il rumore di fondo
+        flatness_threshold: float = 0.45,  # Oltre questo valore lo spettro è "rumore"
+        max_zero_crossing_rate: float = 0.35,
+        hangover_duration: float = 0.5,  # Secondi di parlato mantenuti dopo la fine
+        noise_adaptation: float = 0.05,  # Velocità di aggiornamento del rumore di fondo
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.energy_floor = float(energy_floor)
+        self.energy_ratio = energy_ratio
+        self.flatness_threshold = flatness_threshold
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.hangover_frames = int(np.ceil(hangover_duration * sample_rate / frame_size))
+        self.noise_adaptation = noise_adaptation
+
+        self._window = np.hanning(frame_size).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        """Reimposta lo stato adattivo (rumore di fondo e hangover)"""
+        self.noise_floor = self.energy_floor / self.energy_ratio
+        self._hangover = 0
+
+    def frames(self, signal: np.ndarray) -> np.ndarray:
+        """Divide il segnale in frame non sovrapposti (il resto finale è scartato)"""
+        n_frames = len(signal) // self.frame_size
+        return signal[: n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+
+    def features(self, frames: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Energia, zero-crossing rate e spectral flatness per ogni riga di frames"""
+        # Unica conversione a float32 per tutte le feature
+        x = np.asarray(frames, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[np.newaxis, :]
+
+        energy = np.sqrt(np.mean(np.square(x), axis=1))
+
+        signs = np.signbit(x)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(
+            1, x.shape[1] - 1
+        )
+
+        window = self._window if x.shape[1] == self.frame_size else np.hanning(x.shape[1])
+        power = np.square(np.abs(np.fft.rfft(x * window, axis=1))) + 1e-10
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+
+        return energy, zcr, flatness
+
+    def _decide(self, energy: float, zcr: float, flatness: float) -> bool:
+        """Decisione per un singolo frame con rumore di fondo adattivo e hangover"""
+        threshold = max(self.energy_floor, self.noise_floor * self.energy_ratio)
+        active = (
+            energy > threshold
+            and flatness < self.flatness_threshold
+            and zcr < self.max_zero_crossing_rate
+        )
+
+        if active:
+            self._hangover = self.hangover_frames
+            # Durante il parlato il rumore di fondo può solo scendere
+            self.noise_floor = min(self.noise_floor, energy)
+            return True
+
+        # Aggiorna il rumore di fondo solo sui frame non vocali
+        if energy < self.noise_floor:
+            self.noise_floor = energy
+        else:
+            self.noise_floor += self.noise_adaptation * (energy - self.noise_floor)
+
+        if self._hangover > 0:
+            self._hangover -= 1
+            return True
+        return False
+
+    def is_speech(self, frame: np.ndarray) -> bool:
+        """Classifica un frame in streaming, aggiornando lo stato interno"""
+        energy, zcr, flatness = self.features(frame)
+        return self._decide(float(energy[0]), float(zcr[0]), float(flatness[0]))
+
+    def analyze(self, signal: np.ndarray) -> np.ndarray:
+        """Decisioni parlato/silenzio per tutti i frame di un array"""
+        energy, zcr, flatness = self.features(self.frames(signal))
+        decisions = np.zeros(len(energy), dtype=bool)
+        for i in range(len(energy)):
+            decisions[i] = self._decide(
+                float(energy[i]), float(zcr[i]), float(flatness[i])
+            )
+        return decisions
+
+    def speech_segments(self, signal: np.ndarray) -> list[tuple[int, int]]:
+        """Intervalli (inizio, fine) in campioni che contengono parlato"""
+        decisions = self.analyze(signal)
+        if not decisions.any():
+            return []
+        edges = np.diff(np.concatenate(([0], decisions.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1) * self.frame_size
+        ends = np.flatnonzero(edges == -1) * self.frame_size
+        return list(zip(starts.tolist(), ends.tolist()))